@@ -1,15 +1,31 @@
+import uuid
+
 import streamlit as st
-from langchain_groq import ChatGroq  # type: ignore
-from langchain_core.output_parsers import StrOutputParser  # type: ignore
-from langchain_core.prompts import ChatPromptTemplate  # type: ignore
-import os
-import docx  # type: ignore
-from io import BytesIO
-import time
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from docx_export import DOCX_MIME, SECTION_HEADINGS, ZIP_MIME, ZipExport, document_bytes
+from generators import (
+    get_llm,
+    run_section,
+    stream_section,
+    generate_all_questions,
+    stream_all_questions,
+    run_blueprint_section,
+    generate_all_blueprint,
+    regenerate_questions,
+    run_paper_job,
+    SECTION_KEYS,
+)
+from blueprint import DEFAULT_BLUEPRINT, BlueprintResult, parse_blueprint
+from paper_state import PaperState
+from generation_service import set_user
+from jobs import DONE, JobQueue
+from sharding import DEFAULT_BATCH_SIZE
+from question_parser import QuestionStreamParser
+from question_bank import REUSE_AFTER_DAYS
+from dedupe import DEDUPE_HISTORY, DEDUPE_OFF, DEDUPE_PAPER
+from syllabus import MAX_SYLLABUS_CHARS, read_syllabus, split_topics
+import telemetry
+
 # Set the Streamlit page configuration
 st.set_page_config(
     page_title="Question Generator",
@@ -17,203 +33,419 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize the language model (make sure to keep your API key secure)
-
-
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    raise ValueError("GROQ_API_KEY environment variable is not set. Please set it before running the app.")
-
-llm = ChatGroq(
-    api_key=api_key,
-    model="llama3-70b-8192"  # Or any valid Groq model
-)
-
-
-# Function to generate MCQs
-def generate_mcq_questions(subject_name, syllabus, num_mcq, bl_level):
-    prompt_template = """
-    You are an expert in Bloom's Taxonomy and question generation. Based on the inputs below, generate {num_mcq} multiple-choice questions (MCQs) using the following format.
-
-    Use the following short codes for Bloom’s levels:
-
-    BL1: Remember  
-    BL2: Understand  
-    BL3: Apply  
-    BL4: Analyze  
-    BL5: Evaluate  
-    BL6: Create
-
-    {level_instruction}
-
-    Format:
-    Q1. What is the capital of France? [BL1]  
-    (a) Berlin (b) Madrid (c) Paris (d) Rome
-
-    Do NOT provide answers. Only questions.
-
-    Subject: {subject_name}  
-    Syllabus: {syllabus}
-    """
-    level_instruction = f"Generate ONLY {bl_level} level questions." if bl_level != "Random (All Levels)" else "Generate questions across all Bloom's levels."
-    prompt = prompt_template.format(subject_name=subject_name, syllabus=syllabus, num_mcq=num_mcq, level_instruction=level_instruction)
-    chain = (ChatPromptTemplate.from_template(prompt) | llm | StrOutputParser())
-    return chain.invoke({})
-
-# Function to generate short answer questions
-def generate_short_questions(subject_name, syllabus, num_short, bl_level):
-    prompt_template = """
-    You are an expert in Bloom's Taxonomy and question generation. Generate {num_short} short answer questions using Bloom's short codes:
-
-    BL1: Remember  
-    BL2: Understand  
-    BL3: Apply  
-    BL4: Analyze  
-    BL5: Evaluate  
-    BL6: Create
-
-    {level_instruction}
-
-    Format:
-    Q1. Explain the process of normalization. [BL2]
-
-    Do NOT provide answers. Only questions.
-
-    Subject: {subject_name}  
-    Syllabus: {syllabus}
-    """
-    level_instruction = f"Generate ONLY {bl_level} level questions." if bl_level != "Random (All Levels)" else "Generate questions across all Bloom's levels."
-    prompt = prompt_template.format(subject_name=subject_name, syllabus=syllabus, num_short=num_short, level_instruction=level_instruction)
-    chain = (ChatPromptTemplate.from_template(prompt) | llm | StrOutputParser())
-    return chain.invoke({})
-
-# Function to generate long answer questions
-def generate_long_questions(subject_name, syllabus, num_long, bl_level):
-    prompt_template = """
-    You are an expert in Bloom's Taxonomy and question generation. Generate {num_long} long answer questions using Bloom's short codes:
-
-    BL1: Remember  
-    BL2: Understand  
-    BL3: Apply  
-    BL4: Analyze  
-    BL5: Evaluate  
-    BL6: Create
-
-    {level_instruction}
-
-    Format:
-    Q1. Design and implement a compiler for a toy language. [BL6]
-
-    Do NOT provide answers. Only questions.
-
-    Subject: {subject_name}  
-    Syllabus: {syllabus}
-    """
-    level_instruction = f"Generate ONLY {bl_level} level questions." if bl_level != "Random (All Levels)" else "Generate questions across all Bloom's levels."
-    prompt = prompt_template.format(subject_name=subject_name, syllabus=syllabus, num_long=num_long, level_instruction=level_instruction)
-    chain = (ChatPromptTemplate.from_template(prompt) | llm | StrOutputParser())
-    return chain.invoke({})
-
-# Initialize session state
-if "mcq_questions" not in st.session_state:
-    st.session_state.mcq_questions = ""
-if "short_questions" not in st.session_state:
-    st.session_state.short_questions = ""
-if "long_questions" not in st.session_state:
-    st.session_state.long_questions = ""
-
-# Title and header
-st.title("Test Paper Generator using :red[Bloom's Taxonomy]📚")
-
-# Sidebar with a custom background and title
-st.sidebar.image("assets/compressed_becd011b419db54d4ea278a2d0425d7b.png")
-st.sidebar.title("Question Generator")
-st.sidebar.header("Input Details")
-
-# User Inputs
-subject_name = st.sidebar.text_input("Enter Subject Name")
-syllabus = st.sidebar.text_area("Enter Syllabus (or upload)", height=200)
-num_mcq = st.sidebar.slider("Number of MCQ questions", 0, 100, 10)
-num_short = st.sidebar.slider("Number of Short Questions", 0, 100, 5)
-num_long = st.sidebar.slider("Number of Long Questions", 0, 50, 3)
-
-bl_level = st.sidebar.selectbox(
-    "Select Bloom's Taxonomy Level",
-    options=["Random (All Levels)", "BL1", "BL2", "BL3", "BL4", "BL5", "BL6"]
-)
-
-# Buttons with icons and tooltips
-mcq_button = st.sidebar.button("Generate MCQs", help="Generate multiple choice questions based on your inputs")
-short_button = st.sidebar.button("Generate Short Questions", help="Generate short answer questions")
-long_button = st.sidebar.button("Generate Long Questions", help="Generate long answer questions")
-all_button = st.sidebar.button("Generate All Questions", help="Generate all questions (MCQs, Short, and Long)")
-
-# Display generated questions
-if mcq_button:
-    if subject_name and syllabus:
-        with st.spinner('Generating MCQs...'):
-            st.session_state.mcq_questions = generate_mcq_questions(subject_name, syllabus, num_mcq, bl_level)
+# Function to show a streamed section question by question, then swap in the final text area; returns the full text
+def render_streamed_section(chunks, placeholder, label, section):
+    parts = []
+    parser = QuestionStreamParser(section)
+    for chunk in chunks:
+        parts.append(chunk)
+        # Redraw only when another question is complete rather than on every token
+        if parser.feed(chunk):
+            placeholder.text("".join(parts))
+    questions = "".join(parts)
+    placeholder.text_area(label, value=questions, height=300)
+    return questions
+
+# Function to show a section generated to a blueprint, with how many slots of each band were filled
+def show_blueprint_result(result, label):
+    st.text_area(label, value=result.text, height=300)
+    show_blueprint_summary(result)
+
+# Function to report how well a section met its blueprint; slots padded with wrong-level questions get a warning
+def show_blueprint_summary(result, heading=""):
+    if not result.planned:
+        return
+    summary = ", ".join(f"{band} {result.filled.get(band, 0)}/{planned}" for band, planned in result.planned.items())
+    rounds = "1 round" if result.rounds == 1 else f"{result.rounds} rounds"
+    if result.compliant:
+        st.caption(f"{heading}Blueprint met ({summary}) with {result.requests} requests in {rounds}.")
+        return
+    padded = sum(result.best_effort.values())
+    note = f" {padded} of the questions are at a different level than their band asks for; review them before use." if padded else ""
+    st.warning(f"{heading}Blueprint not met after {rounds} ({summary}).{note} Generate again to fill the remaining slots.")
+
+# Function to start the background job pool once per process, picking up jobs a previous run left unfinished
+@st.cache_resource
+def get_job_queue():
+    job_queue = JobQueue()
+    job_queue.register("paper", run_paper_job)
+    job_queue.recover()
+    return job_queue
+
+# Function to show a background job; once it finishes, its sections become the current paper
+def render_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.warning("That background job no longer exists.")
+        return
+    st.subheader(f"Background Job: {job.params['subject_name']}")
+    if not job.finished:
+        st.progress(job.progress, text=job.message or job.status.capitalize())
+        for section, text in ((job.result or {}).get("sections") or {}).items():
+            st.markdown(f"**{SECTION_HEADINGS[section]}** (in progress)")
+            st.text(text)
+        if st.button("Cancel Job", key=f"cancel_{job_id}"):
+            get_job_queue().cancel(job_id)
+        return
+    if job.status != DONE:
+        st.error(job.error or "The job was cancelled.")
+        return
+    if st.session_state.get("loaded_job") != job_id:
+        for section, text in job.result["sections"].items():
+            st.session_state[section] = text
+        st.session_state.loaded_job = job_id
+        # Rerun the whole page so the review panel and downloads pick up the new paper
+        st.rerun()
+    st.success(f"Finished {', '.join(SECTION_HEADINGS[section] for section in job.result['sections'])}.")
+    for section, report in job.result.get("blueprint", {}).items():
+        show_blueprint_summary(BlueprintResult(**{"best_effort": {}, **report}), f"{SECTION_HEADINGS[section]}: ")
+
+# Poll a running job every two seconds without rerunning the rest of the page
+poll_job = st.fragment(run_every=2)(render_job)
+
+# Function to extract an uploaded syllabus once per file rather than on every rerun
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_syllabus(data, name):
+    return read_syllabus(data, name)
+
+# Streamlit UI
+def main():
+    # Queue this session's llm calls under its own name, so one busy session can't crowd out the others
+    script_context = get_script_run_ctx()
+    set_user(script_context.session_id if script_context else None)
+
+    # Build the language model client once per process (make sure to keep your API key secure)
+    get_llm()
+
+    # Initialize session state
+    if "mcq_questions" not in st.session_state:
+        st.session_state.mcq_questions = ""
+    if "short_questions" not in st.session_state:
+        st.session_state.short_questions = ""
+    if "long_questions" not in st.session_state:
+        st.session_state.long_questions = ""
+    if "zip_papers" not in st.session_state:
+        st.session_state.zip_papers = []
+    if "paper" not in st.session_state:
+        st.session_state.paper = PaperState()
+
+    # Title and header
+    st.title("Test Paper Generator using :red[Bloom's Taxonomy]📚")
+
+    # Sidebar with a custom background and title
+    st.sidebar.image("assets/compressed_becd011b419db54d4ea278a2d0425d7b.png")
+    st.sidebar.title("Question Generator")
+    st.sidebar.header("Input Details")
+
+    # User Inputs
+    subject_name = st.sidebar.text_input("Enter Subject Name")
+    syllabus = st.sidebar.text_area("Enter Syllabus (or upload)", height=200)
+    syllabus_file = st.sidebar.file_uploader("Upload Syllabus", type=["pdf", "docx", "txt"], help="Used instead of the text above")
+    if syllabus_file is not None:
+        try:
+            syllabus = load_syllabus(syllabus_file.getvalue(), syllabus_file.name)
+        except ValueError as exc:
+            st.sidebar.error(str(exc))
+    if len(syllabus) > MAX_SYLLABUS_CHARS:
+        st.sidebar.caption(f"Long syllabus: questions are generated per topic across {len(split_topics(syllabus))} topics and merged.")
+    num_mcq = st.sidebar.slider("Number of MCQ questions", 0, 100, 10)
+    num_short = st.sidebar.slider("Number of Short Questions", 0, 100, 5)
+    num_long = st.sidebar.slider("Number of Long Questions", 0, 50, 3)
+
+    BLUEPRINT_OPTION = "Blueprint (fixed mix)"
+    bl_level = st.sidebar.selectbox(
+        "Select Bloom's Taxonomy Level",
+        options=["Random (All Levels)", "BL1", "BL2", "BL3", "BL4", "BL5", "BL6", BLUEPRINT_OPTION]
+    )
+    # In blueprint mode each section is split into exact per-level slot counts, checked with the analyzer's classifier
+    bands = None
+    if bl_level == BLUEPRINT_OPTION:
+        blueprint_text = st.sidebar.text_input(
+            "Blueprint (% per level)",
+            value=DEFAULT_BLUEPRINT,
+            help="Share of each section per Bloom's level, adding up to 100. Use BL4+ for BL4 and above, or a range like BL4-BL5."
+        )
+        try:
+            bands = parse_blueprint(blueprint_text)
+        except ValueError as exc:
+            st.sidebar.error(str(exc))
+
+    sharded = st.sidebar.checkbox(
+        "Sharded generation",
+        help=f"Split large question counts into parallel batches of {DEFAULT_BATCH_SIZE} over different parts of the syllabus, then merge and renumber them"
+    )
+    # Off by default: a background job shows its questions on the job view's two-second poll, while an inline
+    # stream shows the first question as soon as the model has written it
+    background = st.sidebar.checkbox(
+        "Run in background",
+        help="Generation keeps going while you change settings or close the tab; open the same URL again to pick up the result"
+    )
+    stream_output = st.sidebar.checkbox(
+        "Stream questions as they are generated",
+        value=True,
+        disabled=background,
+        help="Show questions in the page while the model is still writing them (not available for background jobs)"
+    )
+    use_bank = st.sidebar.checkbox(
+        "Reuse questions from the question bank",
+        value=True,
+        help=f"Fill as many questions as possible from earlier papers for this subject (not used in the last {REUSE_AFTER_DAYS:g} days) and only generate the rest"
+    )
+    duplicate_checks = {
+        "Within this paper": DEDUPE_PAPER,
+        "Against earlier papers too": DEDUPE_HISTORY,
+        "Off": DEDUPE_OFF,
+    }
+    dedupe = duplicate_checks[st.sidebar.selectbox(
+        "Duplicate check",
+        options=list(duplicate_checks),
+        help="Near-duplicate questions are dropped and only those slots are generated again"
+    )]
+    bypass_cache = st.sidebar.checkbox(
+        "Bypass cache / regenerate",
+        help="Ignore previously generated results for these inputs and ask the model again"
+    )
+
+    # Jobs belong to whoever holds this URL, so a reload or a bookmark finds them again
+    if "owner" not in st.query_params:
+        st.query_params["owner"] = uuid.uuid4().hex
+    owner = st.query_params["owner"]
+
+    # Buttons with icons and tooltips
+    mcq_button = st.sidebar.button("Generate MCQs", help="Generate multiple choice questions based on your inputs")
+    short_button = st.sidebar.button("Generate Short Questions", help="Generate short answer questions")
+    long_button = st.sidebar.button("Generate Long Questions", help="Generate long answer questions")
+    all_button = st.sidebar.button("Generate All Questions", help="Generate all questions (MCQs, Short, and Long)")
+
+    # Submit the request as a background job; the page attaches to it by id from the URL
+    if background and (mcq_button or short_button or long_button or all_button):
+        if subject_name and syllabus and (bl_level != BLUEPRINT_OPTION or bands is not None):
+            st.query_params["job"] = get_job_queue().submit("paper", {
+                "subject_name": subject_name,
+                "syllabus": syllabus,
+                "num_mcq": num_mcq if mcq_button or all_button else 0,
+                "num_short": num_short if short_button or all_button else 0,
+                "num_long": num_long if long_button or all_button else 0,
+                "bl_level": bl_level,
+                "blueprint": blueprint_text if bl_level == BLUEPRINT_OPTION else None,
+                "sharded": sharded,
+                "use_cache": not bypass_cache,
+                "use_bank": use_bank,
+                "dedupe": dedupe,
+            }, owner)
+
+    # Display generated questions
+    if mcq_button and not background:
+        if subject_name and syllabus:
             st.subheader("Generated MCQ Questions")
             st.markdown(f"**MCQ Questions (Level: {bl_level})**")
-            st.text_area("Generated MCQ Questions", value=st.session_state.mcq_questions, height=300)
-
-if short_button:
-    if subject_name and syllabus:
-        with st.spinner('Generating Short Questions...'):
-            st.session_state.short_questions = generate_short_questions(subject_name, syllabus, num_short, bl_level)
+            with st.spinner('Generating MCQs...'):
+                if bl_level == BLUEPRINT_OPTION:
+                    if bands is not None:
+                        result = run_blueprint_section("mcq", subject_name, syllabus, num_mcq, bands, sharded, not bypass_cache, use_bank, dedupe)
+                        st.session_state.mcq_questions = result.text
+                        show_blueprint_result(result, "Generated MCQ Questions")
+                elif stream_output:
+                    st.session_state.mcq_questions = render_streamed_section(
+                        stream_section("mcq", subject_name, syllabus, num_mcq, bl_level, sharded, not bypass_cache, use_bank, dedupe),
+                        st.empty(),
+                        "Generated MCQ Questions",
+                        "mcq_questions"
+                    )
+                else:
+                    st.session_state.mcq_questions = run_section("mcq", subject_name, syllabus, num_mcq, bl_level, sharded, not bypass_cache, use_bank, dedupe)
+                    st.text_area("Generated MCQ Questions", value=st.session_state.mcq_questions, height=300)
+
+    if short_button and not background:
+        if subject_name and syllabus:
             st.subheader("Generated Short Questions")
             st.markdown(f"**Short Answer Questions (Level: {bl_level})**")
-            st.text_area("Generated Short Questions", value=st.session_state.short_questions, height=300)
-
-if long_button:
-    if subject_name and syllabus:
-        with st.spinner('Generating Long Questions...'):
-            st.session_state.long_questions = generate_long_questions(subject_name, syllabus, num_long, bl_level)
+            with st.spinner('Generating Short Questions...'):
+                if bl_level == BLUEPRINT_OPTION:
+                    if bands is not None:
+                        result = run_blueprint_section("short", subject_name, syllabus, num_short, bands, sharded, not bypass_cache, use_bank, dedupe)
+                        st.session_state.short_questions = result.text
+                        show_blueprint_result(result, "Generated Short Questions")
+                elif stream_output:
+                    st.session_state.short_questions = render_streamed_section(
+                        stream_section("short", subject_name, syllabus, num_short, bl_level, sharded, not bypass_cache, use_bank, dedupe),
+                        st.empty(),
+                        "Generated Short Questions",
+                        "short_questions"
+                    )
+                else:
+                    st.session_state.short_questions = run_section("short", subject_name, syllabus, num_short, bl_level, sharded, not bypass_cache, use_bank, dedupe)
+                    st.text_area("Generated Short Questions", value=st.session_state.short_questions, height=300)
+
+    if long_button and not background:
+        if subject_name and syllabus:
             st.subheader("Generated Long Questions")
             st.markdown(f"**Long Answer Questions (Level: {bl_level})**")
-            st.text_area("Generated Long Questions", value=st.session_state.long_questions, height=300)
-
-# Generate all questions (MCQs, Short, and Long)
-if all_button:
-    if subject_name and syllabus:
-        with st.spinner('Generating All Questions...'):
-            st.session_state.mcq_questions = generate_mcq_questions(subject_name, syllabus, num_mcq, bl_level)
-            st.session_state.short_questions = generate_short_questions(subject_name, syllabus, num_short, bl_level)
-            st.session_state.long_questions = generate_long_questions(subject_name, syllabus, num_long, bl_level)
-            
+            with st.spinner('Generating Long Questions...'):
+                if bl_level == BLUEPRINT_OPTION:
+                    if bands is not None:
+                        result = run_blueprint_section("long", subject_name, syllabus, num_long, bands, sharded, not bypass_cache, use_bank, dedupe)
+                        st.session_state.long_questions = result.text
+                        show_blueprint_result(result, "Generated Long Questions")
+                elif stream_output:
+                    st.session_state.long_questions = render_streamed_section(
+                        stream_section("long", subject_name, syllabus, num_long, bl_level, sharded, not bypass_cache, use_bank, dedupe),
+                        st.empty(),
+                        "Generated Long Questions",
+                        "long_questions"
+                    )
+                else:
+                    st.session_state.long_questions = run_section("long", subject_name, syllabus, num_long, bl_level, sharded, not bypass_cache, use_bank, dedupe)
+                    st.text_area("Generated Long Questions", value=st.session_state.long_questions, height=300)
+
+    # Generate all questions (MCQs, Short, and Long)
+    if all_button and not background:
+        if subject_name and syllabus:
             st.subheader("Generated All Questions")
-            st.markdown(f"**MCQ Questions (Level: {bl_level})**")
-            st.text_area("Generated MCQ Questions", value=st.session_state.mcq_questions, height=300)
-            st.markdown(f"**Short Answer Questions (Level: {bl_level})**")
-            st.text_area("Generated Short Questions", value=st.session_state.short_questions, height=300)
-            st.markdown(f"**Long Answer Questions (Level: {bl_level})**")
-            st.text_area("Generated Long Questions", value=st.session_state.long_questions, height=300)
-
-# Download generated questions as DOCX
-if st.sidebar.button("Generate All Questions as DOCX"):
-    if st.session_state.mcq_questions or st.session_state.short_questions or st.session_state.long_questions:
-        doc = docx.Document()
-        if st.session_state.mcq_questions:
-            doc.add_heading("Generated MCQ Questions", level=1)
-            doc.add_paragraph(st.session_state.mcq_questions)
-        if st.session_state.short_questions:
-            doc.add_heading("Generated Short Answer Questions", level=1)
-            doc.add_paragraph(st.session_state.short_questions)
-        if st.session_state.long_questions:
-            doc.add_heading("Generated Long Answer Questions", level=1)
-            doc.add_paragraph(st.session_state.long_questions)
-
-        doc_io = BytesIO()
-        doc.save(doc_io)
-        doc_io.seek(0)
-
-        st.download_button(
-            label="Download as DOCX",
-            data=doc_io,
+            # Reserve a slot per section so each one renders in place as soon as it finishes
+            section_labels = {
+                "mcq_questions": ("MCQ Questions", "Generated MCQ Questions"),
+                "short_questions": ("Short Answer Questions", "Generated Short Questions"),
+                "long_questions": ("Long Answer Questions", "Generated Long Questions"),
+            }
+            placeholders = {section: st.empty() for section in section_labels}
+            with st.spinner('Generating All Questions...'):
+                if bl_level == BLUEPRINT_OPTION:
+                    if bands is not None:
+                        for section, result in generate_all_blueprint(subject_name, syllabus, num_mcq, num_short, num_long, bands, sharded, not bypass_cache, use_bank, dedupe):
+                            st.session_state[section] = result.text
+                            heading, label = section_labels[section]
+                            with placeholders[section].container():
+                                st.markdown(f"**{heading} (Level: {bl_level})**")
+                                show_blueprint_result(result, label)
+                elif stream_output:
+                    streamed = {section: [] for section in section_labels}
+                    parsers = {section: QuestionStreamParser(section) for section in section_labels}
+                    for section, chunk in stream_all_questions(subject_name, syllabus, num_mcq, num_short, num_long, bl_level, sharded, not bypass_cache, use_bank, dedupe):
+                        heading, label = section_labels[section]
+                        if chunk is None:
+                            st.session_state[section] = "".join(streamed[section])
+                            with placeholders[section].container():
+                                st.markdown(f"**{heading} (Level: {bl_level})**")
+                                st.text_area(label, value=st.session_state[section], height=300)
+                            continue
+                        streamed[section].append(chunk)
+                        # Redraw only when another question is complete rather than on every token
+                        if parsers[section].feed(chunk):
+                            with placeholders[section].container():
+                                st.markdown(f"**{heading} (Level: {bl_level})**")
+                                st.text("".join(streamed[section]))
+                else:
+                    for section, questions in generate_all_questions(subject_name, syllabus, num_mcq, num_short, num_long, bl_level, sharded, not bypass_cache, use_bank, dedupe):
+                        st.session_state[section] = questions
+                        heading, label = section_labels[section]
+                        with placeholders[section].container():
+                            st.markdown(f"**{heading} (Level: {bl_level})**")
+                            st.text_area(label, value=questions, height=300)
+
+    # Attach to the job named in the URL; it keeps polling until the job finishes
+    if "job" in st.query_params:
+        job = get_job_queue().get(st.query_params["job"])
+        if job is not None and not job.finished:
+            poll_job(job.id)
+        else:
+            render_job(st.query_params["job"])
+
+    recent_jobs = get_job_queue().list(owner)
+    if recent_jobs:
+        with st.sidebar.expander("Background Jobs"):
+            for job in recent_jobs:
+                label = f"{job.params['subject_name']}: {job.status} ({job.progress:.0%})"
+                if st.button(label, key=f"open_{job.id}", disabled=job.id == st.query_params.get("job")):
+                    st.query_params["job"] = job.id
+                    st.rerun()
+
+    # Keep the versioned paper in step with freshly generated sections; regeneration and undo below work on it
+    paper = st.session_state.paper
+    for section in SECTION_HEADINGS:
+        paper.load(section, st.session_state[section])
+
+    # Review the paper: replace or remove chosen questions without regenerating the rest of the section
+    if paper.total():
+        st.subheader(f"Review Paper (version {paper.version})")
+        if "review_notice" in st.session_state:
+            st.warning(st.session_state.pop("review_notice"))
+        question_types = {section: question_type for question_type, section in SECTION_KEYS.items()}
+        for section, heading in SECTION_HEADINGS.items():
+            questions = paper.questions(section)
+            if not questions:
+                continue
+            with st.expander(f"{heading} ({len(questions)})"):
+                st.text(paper.text(section))
+                # Keyed by version so the selection is cleared once the paper changes
+                chosen = st.multiselect(
+                    "Questions to change",
+                    options=list(range(len(questions))),
+                    format_func=lambda position, questions=questions: f"Q{position + 1}. {questions[position].stem[:80]}",
+                    key=f"review_{section}_{paper.version}"
+                )
+                regenerate_column, remove_column = st.columns(2)
+                if regenerate_column.button("Regenerate selected", key=f"regenerate_{section}", disabled=not chosen or not (subject_name and syllabus), help="Only these questions are sent to the model; the rest of the section is kept and excluded"):
+                    with st.spinner(f"Regenerating {len(chosen)} questions..."):
+                        level = "Random (All Levels)" if bl_level == BLUEPRINT_OPTION else bl_level
+                        replacements = regenerate_questions(question_types[section], subject_name, syllabus, questions, chosen, level, dedupe)
+                    paper.replace(section, replacements)
+                    if len(replacements) < len(chosen):
+                        st.session_state.review_notice = f"Only {len(replacements)} of {len(chosen)} questions could be replaced with new ones; the others were kept."
+                    st.session_state[section] = paper.text(section)
+                    st.rerun()
+                if remove_column.button("Remove selected", key=f"remove_{section}", disabled=not chosen):
+                    paper.remove(section, chosen)
+                    st.session_state[section] = paper.text(section)
+                    st.rerun()
+        if st.button("Undo last change", disabled=not paper.can_undo):
+            section = paper.undo()
+            st.session_state[section] = paper.text(section)
+            st.rerun()
+
+    # Download generated questions as DOCX; the document is only rebuilt when the questions change
+    sections = paper.sections()
+    if any(sections.values()):
+        st.sidebar.download_button(
+            label="Download All Questions as DOCX",
+            data=document_bytes(sections),
             file_name="generated_questions.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            mime=DOCX_MIME
         )
-
-# Add a footer with information or tips
-st.markdown("<hr>", unsafe_allow_html=True)
-st.markdown("### Tips: \n - Enter the subject name and syllabus to generate questions. \n - Choose the number of questions and Bloom's level.", unsafe_allow_html=True)
+        if st.sidebar.button("Add Paper to ZIP Export", help="Keep this paper so several papers can be downloaded together as one ZIP"):
+            st.session_state.zip_papers.append((f"{subject_name or 'paper'}.docx", sections, subject_name or None))
+
+    # Export collected papers as one ZIP, built in the background so the page stays responsive
+    if st.session_state.zip_papers:
+        if st.sidebar.button(f"Build ZIP of {len(st.session_state.zip_papers)} Papers"):
+            if "zip_export" in st.session_state:
+                st.session_state.zip_export.discard()
+            st.session_state.zip_export = ZipExport(st.session_state.zip_papers)
+    if "zip_export" in st.session_state:
+        zip_export = st.session_state.zip_export
+        if not zip_export.future.done():
+            st.sidebar.info("Building the ZIP in the background; interact with the page to check on it.")
+        elif zip_export.future.exception() is not None:
+            st.sidebar.error(f"ZIP export failed: {zip_export.future.exception()}")
+        else:
+            # Read from disk only when clicked, rather than into memory on every rerun
+            st.sidebar.download_button(
+                label=f"Download {zip_export.future.result()} Papers as ZIP",
+                data=zip_export.read,
+                file_name="question_papers.zip",
+                mime=ZIP_MIME,
+                on_click="ignore"
+            )
+
+    # Add a footer with information or tips
+    st.markdown("<hr>", unsafe_allow_html=True)
+    st.markdown("### Tips: \n - Enter the subject name and syllabus to generate questions. \n - Choose the number of questions and Bloom's level.", unsafe_allow_html=True)
+
+if __name__ == "__main__":
+    # Time this run of the script (and profile it when QPG_PROFILE=1 or the URL has ?profile=1). finally also
+    # times reruns cut short by st.rerun() or an error
+    rerun = telemetry.start_rerun("app", profile=st.query_params.get("profile") == "1")
+    try:
+        main()
+    finally:
+        telemetry.finish_rerun(rerun)
@@ -0,0 +1,239 @@
+# Headless batch paper generation: one DOCX per course in a CSV/JSONL manifest, plus results.csv.
+#
+#     python batch_generate.py courses.csv --out-dir papers --workers 4 --rpm 30 --tpm 6000
+#
+# Finished courses are appended to a checkpoint file, so rerunning after a crash skips them.
+# Pass --stub to run against the local stand-in model instead of Groq, and --zip to get one papers.zip
+# (built on a process pool once all courses are generated) instead of loose DOCX files.
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from docx_export import document_bytes, write_zip
+from generation_service import generation_service
+from generators import (
+    SECTION_KEYS,
+    generate_questions,
+    groq_router,
+    needs_topic_split,
+    question_bank,
+    set_llm,
+    set_router,
+)
+from rate_limiter import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, RateLimiter, call_with_retries
+from question_parser import parse_questions
+from sharding import generate_sharded
+
+# Defaults match the sliders in app.py
+DEFAULT_COUNTS = {"mcq": 10, "short": 5, "long": 3}
+DEFAULT_LEVEL = "Random (All Levels)"
+
+RESULT_FIELDS = ["job_id", "subject", "status", "docx", "mcq", "short", "long", "seconds", "retries", "error"]
+
+
+# Function to read a CSV or JSONL manifest into a list of job dicts
+def load_manifest(path):
+    with open(path, newline="", encoding="utf-8") as manifest:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in manifest if line.strip()]
+        else:
+            rows = list(csv.DictReader(manifest))
+    return [_normalize_job(row) for row in rows]
+
+
+def _normalize_job(row):
+    subject = (row.get("subject") or row.get("subject_name") or "").strip()
+    syllabus = (row.get("syllabus") or "").strip()
+    if not subject or not syllabus:
+        raise ValueError(f"Manifest row is missing a subject or syllabus: {row}")
+    job = {
+        "subject": subject,
+        "syllabus": syllabus,
+        "bl_level": (row.get("bl_level") or DEFAULT_LEVEL).strip(),
+    }
+    for question_type, default in DEFAULT_COUNTS.items():
+        value = row.get(f"num_{question_type}")
+        job[f"num_{question_type}"] = int(value) if value not in (None, "") else default
+    # Rows without an explicit id get a stable one, so checkpoints survive reordering the manifest
+    job["job_id"] = str(row.get("id") or row.get("job_id") or "").strip() or hashlib.sha1(
+        json.dumps(job, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+    return job
+
+
+# Function to read the ids (and results) of jobs finished by an earlier run
+def load_checkpoint(path):
+    completed = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as checkpoint:
+            for line in checkpoint:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave a half-written last line
+                    continue
+                completed[record["job_id"]] = record
+    return completed
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:40] or "paper"
+
+
+# Runs manifest jobs on a worker pool, pacing every LLM call through one shared rate limiter
+class BatchRunner:
+    def __init__(self, out_dir, limiter, workers=4, checkpoint_path=None, use_cache=True, sharded=False, max_retries=5, zip_output=False):
+        self.out_dir = out_dir
+        self.limiter = limiter
+        self.workers = workers
+        self.checkpoint_path = checkpoint_path or os.path.join(out_dir, "checkpoint.jsonl")
+        self.use_cache = use_cache
+        self.sharded = sharded
+        self.max_retries = max_retries
+        self.zip_output = zip_output
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(out_dir, "sections") if zip_output else out_dir, exist_ok=True)
+
+    def run(self, jobs):
+        # Every LLM call, including batches of a split section, failovers and retries, is paced in the service
+        generation_service.limiter = self.limiter
+        completed = load_checkpoint(self.checkpoint_path)
+        results = [completed[job["job_id"]] for job in jobs if job["job_id"] in completed]
+        pending = [job for job in jobs if job["job_id"] not in completed]
+        print(f"{len(jobs)} jobs: {len(results)} already done, {len(pending)} to run")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run_job, job) for job in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                results.append(record)
+                print(f"[{done}/{len(pending)}] {record['job_id']} {record['subject']}: {record['status']}")
+
+        if self.zip_output:
+            self._write_zip(results)
+        self._write_results(results)
+        return results
+
+    def _run_job(self, job):
+        started = time.monotonic()
+        record = {"job_id": job["job_id"], "subject": job["subject"], "docx": "", "retries": 0, "error": ""}
+        retries = [0]
+        try:
+            sections = {}
+            for question_type in DEFAULT_COUNTS:
+                count = job[f"num_{question_type}"]
+                section = SECTION_KEYS[question_type]
+                sections[section] = self._generate_section(question_type, job, count, retries) if count > 0 else ""
+                questions = parse_questions(sections[section], section)
+                question_bank.add(job["subject"], job["syllabus"], question_type, questions)
+                record[question_type] = len(questions)
+            path = os.path.join(self.out_dir, f"{job['job_id']}_{_slug(job['subject'])}.docx")
+            if self.zip_output:
+                # Keep only the text for now; the DOCX is rendered straight into the ZIP at the end
+                with open(self._sections_path(job["job_id"]), "w", encoding="utf-8") as spool:
+                    json.dump({"subject": job["subject"], "sections": sections}, spool)
+                path = os.path.basename(path)
+            else:
+                with open(path, "wb") as paper:
+                    paper.write(document_bytes(sections, title=job["subject"]))
+            record.update(status="done", docx=path)
+        except Exception as exc:
+            record.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+        record["retries"] = retries[0]
+        record["seconds"] = round(time.monotonic() - started, 2)
+        if record["status"] == "done":
+            self._checkpoint(record)
+        return record
+
+    def _generate_section(self, question_type, job, count, retries):
+        def on_retry(attempt, exc, delay):
+            retries[0] += 1
+            print(f"  {job['job_id']} {question_type}: retry {attempt} in {delay:.1f}s after {type(exc).__name__}")
+
+        def generator(subject_name, syllabus, count, bl_level, shard=None):
+            return call_with_retries(
+                lambda: generate_questions(question_type, subject_name, syllabus, count, bl_level, self.use_cache, shard),
+                max_retries=self.max_retries, on_retry=on_retry,
+            )
+
+        if needs_topic_split(job["syllabus"], count, self.sharded):
+            return generate_sharded(generator, job["subject"], job["syllabus"], count, job["bl_level"])
+        return generator(job["subject"], job["syllabus"], count, job["bl_level"])
+
+    def _checkpoint(self, record):
+        with self.lock, open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            checkpoint.write(json.dumps(record) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+    def _sections_path(self, job_id):
+        return os.path.join(self.out_dir, "sections", f"{job_id}.json")
+
+    def _spooled_papers(self, results):
+        for record in results:
+            path = self._sections_path(record["job_id"])
+            if record["status"] == "done" and os.path.exists(path):
+                with open(path, encoding="utf-8") as spool:
+                    paper = json.load(spool)
+                yield os.path.basename(record["docx"]), paper["sections"], paper["subject"]
+
+    def _write_zip(self, results):
+        path = os.path.join(self.out_dir, "papers.zip")
+        count = write_zip(self._spooled_papers(results), path)
+        print(f"{count} papers written to {path}")
+
+    def _write_results(self, results):
+        path = os.path.join(self.out_dir, "results.csv")
+        with open(path, "w", newline="", encoding="utf-8") as manifest:
+            writer = csv.DictWriter(manifest, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Results written to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate question papers for every course in a manifest.")
+    parser.add_argument("manifest", help="CSV or JSONL file with subject, syllabus, num_mcq, num_short, num_long, bl_level")
+    parser.add_argument("--out-dir", default="papers", help="Directory for the DOCX files and results.csv")
+    parser.add_argument("--workers", type=int, default=4, help="Number of courses generated at once")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_REQUESTS_PER_MINUTE, help="API requests per minute")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TOKENS_PER_MINUTE, help="API tokens per minute")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per call on 429/5xx errors")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <out-dir>/checkpoint.jsonl)")
+    parser.add_argument("--sharded", action="store_true", help="Split large sections into parallel batches")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached responses")
+    parser.add_argument("--stub", action="store_true", help="Use the local stub model instead of Groq")
+    parser.add_argument("--zip", action="store_true", help="Write all papers into <out-dir>/papers.zip instead of separate DOCX files")
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        from stub_llm import StubChatModel
+
+        set_llm(StubChatModel())
+    else:
+        # Retries are left to call_with_retries below, so each one is counted and paced
+        set_router(groq_router(max_retries=0))
+
+    runner = BatchRunner(
+        args.out_dir,
+        RateLimiter(args.rpm, args.tpm),
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        use_cache=not args.no_cache,
+        sharded=args.sharded,
+        max_retries=args.max_retries,
+        zip_output=args.zip,
+    )
+    results = runner.run(load_manifest(args.manifest))
+    failed = sum(1 for record in results if record["status"] != "done")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,344 @@
+# Performance benchmarks, run against the local stub model so they cost no API quota:
+#
+#     python benchmark.py --output bench.json
+#     python benchmark.py --output new.json --compare bench.json
+#
+# Suites: end-to-end paper generation at several question counts, throughput with concurrent users,
+# parsing and DOCX export cost, and analyzer throughput on 1k/10k/100k questions. The stub answers after
+# a simulated first-token latency and decodes at a fixed tokens/second, so timings are repeatable.
+# Results are written as JSON together with the commit they were measured on; --compare reports
+# every result that got slower than the baseline by more than the threshold and exits with status 1.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+SUITES = ("generation", "concurrency", "parsing", "docx", "analyzer")
+
+# Questions per section for the generation suite; each paper has MCQ, short and long sections
+DEFAULT_QUESTION_COUNTS = (5, 20, 50)
+DEFAULT_USERS = (1, 4, 16)
+# Questions per section for each concurrent user's paper
+DEFAULT_USER_QUESTIONS = 10
+DEFAULT_PARSE_SIZES = (100, 1_000, 10_000)
+DEFAULT_DOCX_SIZES = (10, 100)
+DEFAULT_ANALYZER_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_REPEATS = 3
+# Simulated model: delay before the first token, then decoding speed
+DEFAULT_LATENCY = 0.2
+DEFAULT_TOKENS_PER_SECOND = 500.0
+# Median more than this much slower than the baseline counts as a regression
+DEFAULT_THRESHOLD = 0.2
+# Results faster than this are timer noise and never flagged
+MIN_COMPARED_SECONDS = 0.001
+
+SUBJECT = "Database Management Systems"
+SYLLABUS = """Unit 1: Introduction (6 hours)
+Data models, schema and instances, three-schema architecture, data independence.
+Unit 2: Relational Model (8 hours)
+Relational algebra, tuple relational calculus, keys, integrity constraints.
+Unit 3: SQL (10 hours)
+DDL, DML, joins, nested queries, views, triggers, stored procedures.
+Unit 4: Normalization (8 hours)
+Functional dependencies, 1NF, 2NF, 3NF, BCNF, lossless decomposition.
+Unit 5: Transactions (8 hours)
+ACID properties, serializability, two-phase locking, recovery, deadlocks."""
+
+_NOUNS = (
+    "normalization", "a B+ tree index", "the water cycle", "photosynthesis", "two-phase locking",
+    "binary search", "the French Revolution", "supply and demand", "recursion", "TCP congestion control",
+)
+
+
+# Function to point every on-disk store (response cache, question bank, token usage, telemetry) at a scratch directory.
+# Must run before generators is imported, since the stores read their paths at import time.
+def isolate(directory):
+    os.environ["QPG_CACHE_PATH"] = os.path.join(directory, "llm_cache.sqlite3")
+    os.environ["QPG_BANK_PATH"] = os.path.join(directory, "question_bank.sqlite3")
+    os.environ["QPG_USAGE_PATH"] = os.path.join(directory, "token_usage.sqlite3")
+    os.environ["QPG_TELEMETRY_DIR"] = os.path.join(directory, "telemetry")
+
+
+# Function to build a stub model with the given simulated latency and decoding speed
+def fake_model(latency=DEFAULT_LATENCY, tokens_per_second=DEFAULT_TOKENS_PER_SECOND, completion=None):
+    from stub_llm import StubChatModel
+
+    return StubChatModel(latency=latency, tokens_per_second=tokens_per_second, completion=completion)
+
+
+# Function to make `count` varied questions for the analyzer, drawn from the taxonomy's own verbs and starters
+def synthetic_questions(count, seed=0):
+    from bloom_classifier import blooms_taxonomy
+
+    rng = random.Random(seed)
+    verbs = [verb for level in blooms_taxonomy.values() for verb in level["verbs"]]
+    starters = [starter.replace("...", "").replace("__", "it") for level in blooms_taxonomy.values() for starter in level["question_starters"]]
+    questions = []
+    for _ in range(count):
+        noun = rng.choice(_NOUNS)
+        if rng.random() < 0.5:
+            questions.append(f"{rng.choice(starters)} {noun}?")
+        else:
+            questions.append(f"{rng.choice(verbs).capitalize()} {noun} and its effect on {rng.choice(_NOUNS)}.")
+    return questions
+
+
+# Function to time `run` `repeats` times; returns the wall time of each run in seconds
+def measure(run, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _result(suite, name, params, samples, items=None, **extra):
+    median = statistics.median(samples)
+    result = {
+        "suite": suite,
+        "name": name,
+        "params": params,
+        "repeats": len(samples),
+        "min_seconds": round(min(samples), 6),
+        "median_seconds": round(median, 6),
+        "mean_seconds": round(statistics.fmean(samples), 6),
+    }
+    if items is not None:
+        result["items_per_second"] = round(items / median, 2) if median else None
+    result.update(extra)
+    return result
+
+
+def _generate_paper(count, subject=SUBJECT):
+    from generators import stream_all_questions
+
+    first_chunk_at = None
+    started = time.perf_counter()
+    for _, chunk in stream_all_questions(subject, SYLLABUS, count, count, count, "Random (All Levels)", use_cache=False):
+        if first_chunk_at is None and chunk:
+            first_chunk_at = time.perf_counter()
+    return (first_chunk_at or time.perf_counter()) - started
+
+
+# End-to-end paper generation (streamed, as the app does it) with the response cache bypassed
+def bench_generation(counts, repeats):
+    results = []
+    for count in counts:
+        first_chunk = []
+        samples = measure(lambda: first_chunk.append(_generate_paper(count)), repeats)
+        results.append(_result(
+            "generation", "paper", {"questions_per_section": count}, samples, items=3 * count,
+            median_first_chunk_seconds=round(statistics.median(first_chunk), 6),
+        ))
+    return results
+
+
+# Several users generating a paper each at the same moment, sharing one process like Streamlit sessions do
+def bench_concurrency(users_list, count, repeats):
+    results = []
+    for users in users_list:
+        latencies = []
+
+        # Each user asks for a different paper, so the shared service can't coalesce them into one call
+        def user(number):
+            started = time.perf_counter()
+            _generate_paper(count, f"{SUBJECT} (course {number + 1})")
+            latencies.append(time.perf_counter() - started)
+
+        def run():
+            with ThreadPoolExecutor(max_workers=users) as executor:
+                list(executor.map(user, range(users)))
+
+        samples = measure(run, repeats)
+        latencies.sort()
+        results.append(_result(
+            "concurrency", "papers", {"users": users, "questions_per_section": count}, samples, items=users,
+            median_latency_seconds=round(statistics.median(latencies), 6),
+            p95_latency_seconds=round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 6),
+        ))
+    return results
+
+
+def _canned_text(count, multiple_choice):
+    kind = "multiple-choice" if multiple_choice else "short answer"
+    return fake_model(latency=0, tokens_per_second=0).invoke(f"Subject: {SUBJECT}\nGenerate {count} {kind} questions.").content
+
+
+# Parsing model output into questions, in one piece and as a stream of line chunks
+def bench_parsing(sizes, repeats):
+    from question_parser import iter_questions, parse_questions
+
+    results = []
+    for size in sizes:
+        text = _canned_text(size, multiple_choice=True)
+        chunks = text.splitlines(keepends=True)
+        samples = measure(lambda: parse_questions(text, "mcq_questions"), repeats)
+        results.append(_result("parsing", "parse", {"questions": size}, samples, items=size))
+        samples = measure(lambda: list(iter_questions(chunks, "mcq_questions")), repeats)
+        results.append(_result("parsing", "stream", {"questions": size}, samples, items=size))
+    return results
+
+
+# DOCX export: a fresh render, and a rerun served from the content-hash cache
+def bench_docx(sizes, repeats):
+    from docx_export import build_document, document_bytes
+
+    results = []
+    for size in sizes:
+        sections = {
+            "mcq_questions": _canned_text(size, multiple_choice=True),
+            "short_questions": _canned_text(size, multiple_choice=False),
+            "long_questions": _canned_text(size, multiple_choice=False),
+        }
+        samples = measure(lambda: build_document(sections, SUBJECT).save(BytesIO()), repeats)
+        results.append(_result("docx", "render", {"questions_per_section": size}, samples, items=3 * size))
+        document_bytes(sections, SUBJECT)
+        samples = measure(lambda: document_bytes(sections, SUBJECT), repeats)
+        results.append(_result("docx", "cached", {"questions_per_section": size}, samples, items=3 * size))
+    return results
+
+
+# Analyzer throughput: one in-memory batch, and the bulk upload pipeline with its results file
+def bench_analyzer(sizes, repeats):
+    from bloom_classifier import classify_questions
+    from bulk_analysis import BulkSummary, analyze_stream
+    from nltk_resources import measure_cold_start
+
+    def bulk(questions):
+        summary = BulkSummary()
+        try:
+            for batch, scores, _ in analyze_stream((question, 0.0) for question in questions):
+                summary.add(batch, scores)
+        finally:
+            summary.discard()
+
+    results = [_result("analyzer", "cold_start", {}, [measure_cold_start() for _ in range(repeats)])]
+    for size in sizes:
+        questions = synthetic_questions(size)
+        samples = measure(lambda: classify_questions(questions), repeats)
+        results.append(_result("analyzer", "classify", {"questions": size}, samples, items=size))
+        samples = measure(lambda: bulk(questions), repeats)
+        results.append(_result("analyzer", "bulk", {"questions": size}, samples, items=size))
+    return results
+
+
+def _commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def _result_key(result):
+    return result["suite"], result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+# Function to compare two runs; returns (result, baseline, change) for results in both, change as a fraction of the baseline
+def compare(results, baseline_results):
+    baseline = {_result_key(result): result for result in baseline_results}
+    changes = []
+    for result in results:
+        previous = baseline.get(_result_key(result))
+        if previous and previous["median_seconds"]:
+            changes.append((result, previous, result["median_seconds"] / previous["median_seconds"] - 1))
+    return changes
+
+
+def _label(result):
+    params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+    return f"{result['suite']}.{result['name']}" + (f" ({params})" if params else "")
+
+
+def _ints(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generation, parsing, DOCX export and the analyzer against a stub model.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file the results are written to")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Slowdown (0.2 = 20%%) reported as a regression")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of: {', '.join(SUITES)}")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Runs per measurement; the median is compared")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Simulated seconds to the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_TOKENS_PER_SECOND, help="Simulated decoding speed (0 = instant)")
+    parser.add_argument("--counts", type=_ints, default=list(DEFAULT_QUESTION_COUNTS), help="Questions per section for the generation suite")
+    parser.add_argument("--users", type=_ints, default=list(DEFAULT_USERS), help="Concurrent users for the concurrency suite")
+    parser.add_argument("--parse-sizes", type=_ints, default=list(DEFAULT_PARSE_SIZES), help="Question counts for the parsing suite")
+    parser.add_argument("--docx-sizes", type=_ints, default=list(DEFAULT_DOCX_SIZES), help="Questions per section for the DOCX suite")
+    parser.add_argument("--analyzer-sizes", type=_ints, default=list(DEFAULT_ANALYZER_SIZES), help="Question counts for the analyzer suite")
+    args = parser.parse_args(argv)
+
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="qpg-bench-") as scratch:
+        isolate(scratch)
+        from generators import set_llm
+
+        set_llm(fake_model(args.latency, args.tokens_per_second))
+        runners = {
+            "generation": lambda: bench_generation(args.counts, args.repeats),
+            "concurrency": lambda: bench_concurrency(args.users, DEFAULT_USER_QUESTIONS, args.repeats),
+            "parsing": lambda: bench_parsing(args.parse_sizes, args.repeats),
+            "docx": lambda: bench_docx(args.docx_sizes, args.repeats),
+            "analyzer": lambda: bench_analyzer(args.analyzer_sizes, args.repeats),
+        }
+        results = []
+        for suite in suites:
+            print(f"Running {suite}...", flush=True)
+            for result in runners[suite]():
+                rate = f"  {result['items_per_second']:,.0f}/s" if result.get("items_per_second") else ""
+                print(f"  {_label(result)}: {result['median_seconds']:.4f}s{rate}", flush=True)
+                results.append(result)
+
+    report = {
+        "commit": _commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "repeats": args.repeats,
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if not args.compare:
+        return 0
+    with open(args.compare, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("settings") != report["settings"]:
+        print(f"Warning: baseline was run with different settings {baseline.get('settings')}")
+    regressions = 0
+    print(f"Compared with {args.compare} ({baseline.get('commit')}):")
+    for result, previous, change in compare(results, baseline["results"]):
+        flag = ""
+        if change > args.threshold and result["median_seconds"] >= MIN_COMPARED_SECONDS:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {_label(result)}: {previous['median_seconds']:.4f}s -> {result['median_seconds']:.4f}s ({change:+.0%}){flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import re
+
+import numpy as np  # type: ignore
+
+import telemetry
+from nltk_resources import stop_words, word_tokenizer
+
+# Define Bloom's Taxonomy levels and their characteristics
+blooms_taxonomy = {
+    "Remember": {
+        "description": "Recall facts and basic concepts",
+        "verbs": ["define", "duplicate", "list", "memorize", "recall", "repeat", "reproduce", "state", "identify", "name", "recognize"],
+        "question_starters": ["What is...", "Who was...", "When did...", "How would you describe...", "Can you recall...", "How would you define...", "How would you identify..."],
+        "example": "What are the six levels of Bloom's Taxonomy?",
+        "image_url": r"images/remember-at-10.17.08-copy-1-1024x575.jpg"
+    },
+    "Understand": {
+        "description": "Explain ideas or concepts",
+        "verbs": ["classify", "describe", "discuss", "explain", "identify", "locate", "recognize", "report", "select", "translate", "paraphrase", "interpret", "summarize"],
+        "question_starters": ["How would you classify...", "How would you compare...", "What is the main idea of...", "Can you explain what is happening...", "How would you summarize...", "How would you rephrase..."],
+        "example": "Explain the difference between the Remember and Understand levels in Bloom's Taxonomy.",
+        "image_url": r"images/understand-at-10.17.30-copy-1-1024x575.jpg"
+    },
+    "Apply": {
+        "description": "Use information in new situations",
+        "verbs": ["execute", "implement", "solve", "use", "demonstrate", "interpret", "operate", "schedule", "sketch", "apply", "employ", "illustrate", "practice"],
+        "question_starters": ["How would you use...", "What examples can you find to...", "How would you solve __ using what you've learned...", "How would you organize __ to show...", "How would you apply what you learned to develop..."],
+        "example": "Using Bloom's Taxonomy, create a set of questions for teaching photosynthesis.",
+        "image_url": r"images/apply-at-10.17.53-copy-1-1024x575.jpg"
+    },
+    "Analyze": {
+        "description": "Draw connections among ideas",
+        "verbs": ["differentiate", "organize", "relate", "compare", "contrast", "distinguish", "examine", "experiment", "question", "test", "analyze", "categorize", "criticize", "diagram"],
+        "question_starters": ["What are the parts or features of...", "How is __ related to...", "Why do you think...", "What is the theme...", "What motive is there...", "What conclusions can you draw..."],
+        "example": "Analyze how different question types affect student engagement in online learning.",
+        "image_url": r"images/analyze-at-10.18.16-copy-1-1024x575.jpg"
+    },
+    "Evaluate": {
+        "description": "Justify a stand or decision",
+        "verbs": ["appraise", "argue", "defend", "judge", "select", "support", "value", "evaluate", "critique", "weigh", "assess", "choose", "compare", "conclude", "measure"],
+        "question_starters": ["Do you agree with the actions...", "What is your opinion of...", "How would you prove/disprove...", "How would you evaluate...", "What choice would you have made...", "What data was used to make the conclusion..."],
+        "example": "Evaluate the effectiveness of using Bloom's Taxonomy in curriculum design.",
+        "image_url": r"images/evaluate-at-10.18.56-copy-1-1024x575.jpg"
+    },
+    "Create": {
+        "description": "Produce new or original work",
+        "verbs": ["design", "assemble", "construct", "conjecture", "develop", "formulate", "author", "investigate", "create", "compose", "generate", "plan", "produce", "devise", "invent"],
+        "question_starters": ["What would happen if...", "Can you design a __ to...", "Can you see a possible solution to...", "How would you devise your own way to...", "What would you create to change...", "How would you test..."],
+        "example": "Design a new educational framework that builds upon Bloom's Taxonomy for the digital age.",
+        "image_url": r"images/create-at-10.19.27-copy-1-1024x575.jpg"
+    }
+}
+
+# Column order of every score matrix
+LEVELS = list(blooms_taxonomy)
+# Short codes used in generated papers ("[BL1]" .. "[BL6]")
+LEVEL_CODES = {level: f"BL{number}" for number, level in enumerate(LEVELS, start=1)}
+
+# Weights: a matching question starter counts three times as much as a matching verb
+STARTER_WEIGHT = 3
+VERB_WEIGHT = 1
+
+
+# Function to build a character trie of starters; a "" key lists the level columns of starters ending there
+def _build_starter_trie():
+    trie = {}
+    for column, level in enumerate(LEVELS):
+        for starter in blooms_taxonomy[level]["question_starters"]:
+            node = trie
+            for char in starter.lower().replace("...", ""):
+                node = node.setdefault(char, {})
+            node.setdefault("", []).append(column)
+    return trie
+
+
+# Function to build the inverted index from each verb to the level columns listing it
+def _build_verb_index():
+    index = {}
+    for column, level in enumerate(LEVELS):
+        for verb in blooms_taxonomy[level]["verbs"]:
+            index.setdefault(verb, []).append(column)
+    return index
+
+
+_STARTER_TRIE = _build_starter_trie()
+_VERB_INDEX = _build_verb_index()
+# A verb can only be a token if it appears somewhere in the text, so this skips tokenizing most non-matches
+_VERB_GATE = re.compile("|".join(sorted(map(re.escape, _VERB_INDEX), key=len, reverse=True)))
+# Keyword patterns used only when no starter or verb matched, in level order
+_FALLBACK_PATTERNS = [
+    re.compile(pattern)
+    for pattern in (
+        r"what is|who is|when|where|list|name|identify",
+        r"describe|explain|summarize|interpret|infer",
+        r"apply|use|demonstrate|illustrate|show",
+        r"analyze|compare|contrast|examine|investigate",
+        r"evaluate|assess|justify|critique|recommend",
+        r"create|design|develop|compose|construct|formulate",
+    )
+]
+
+
+# Function to score one lowercased question; returns one score per level
+def _score(question):
+    row = [0] * len(LEVELS)
+    # Walk the trie once: every starter that prefixes the question is found on the way down
+    node = _STARTER_TRIE
+    for char in question:
+        node = node.get(char)
+        if node is None:
+            break
+        for column in node.get("", ()):
+            row[column] += STARTER_WEIGHT
+
+    if _VERB_GATE.search(question):
+        # Each verb counts once however often it appears, as in the per-question analyzer
+        verbs = {token for token in word_tokenizer()(question) if token in _VERB_INDEX}
+        for verb in verbs - stop_words():
+            for column in _VERB_INDEX[verb]:
+                row[column] += VERB_WEIGHT
+
+    if not any(row):
+        for column, pattern in enumerate(_FALLBACK_PATTERNS):
+            if pattern.search(question):
+                row[column] += 1
+    return row
+
+
+# Function to score many questions at once; returns an (n, len(LEVELS)) integer matrix
+def score_questions(questions):
+    scores = np.array([_score(question.lower()) for question in questions], dtype=np.int64)
+    return scores.reshape(len(questions), len(LEVELS))
+
+
+# Function to turn a score matrix into (level, confidence) pairs; unmatched questions default to Remember
+def levels_from_scores(scores):
+    totals = scores.sum(axis=1)
+    # argmax takes the first level on ties, like max() over the taxonomy in order
+    best = scores.argmax(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        confidence = scores[np.arange(len(scores)), best] / totals * 100
+    return [
+        (LEVELS[column], value) if total else (LEVELS[0], 0)
+        for column, value, total in zip(best.tolist(), confidence.tolist(), totals.tolist())
+    ]
+
+
+# Function to classify a list of questions into (level, confidence) pairs
+def classify_questions(questions):
+    telemetry.increment("qpg_analyze_questions_total", len(questions), mode="batch")
+    with telemetry.timed("qpg_analyze_seconds", "analyze", mode="batch") as fields:
+        fields["questions"] = len(questions)
+        return levels_from_scores(score_questions(questions))
+
+
+# Function to analyze a question and determine its Bloom's level
+def analyze_question(question):
+    return classify_questions([question])[0]
@@ -0,0 +1,96 @@
+import re
+from dataclasses import dataclass, field
+
+from syllabus import allocate_counts
+
+BLOOM_CODES = ("BL1", "BL2", "BL3", "BL4", "BL5", "BL6")
+# A typical exam board blueprint: 20% BL1, 30% BL2, 30% BL3 and 20% at BL4 or above
+DEFAULT_BLUEPRINT = "BL1: 20, BL2: 30, BL3: 30, BL4+: 20"
+
+# "BL2: 30", "BL4+ = 20%", "BL4-BL6: 20"
+_ENTRY = re.compile(r"^BL([1-6])(?:(\+)|\s*-\s*BL([1-6]))?\s*[:=]\s*(\d+(?:\.\d+)?)\s*%?$", re.IGNORECASE)
+_LABEL = re.compile(r"^BL([1-6])(?:(\+)|-BL([1-6]))?$", re.IGNORECASE)
+
+
+# One line of a blueprint: a Bloom's level or range of levels, and its share of the section in percent
+@dataclass(frozen=True, slots=True)
+class Band:
+    label: str
+    levels: tuple
+    share: float
+
+
+# Outcome of a blueprint section: the paper text, and per band how many slots were planned and filled. Slots no
+# round could fill at the right level are padded with the best questions left over, counted in `best_effort`.
+@dataclass(slots=True)
+class BlueprintResult:
+    text: str = ""
+    planned: dict = field(default_factory=dict)
+    filled: dict = field(default_factory=dict)
+    best_effort: dict = field(default_factory=dict)
+    requests: int = 0
+    rounds: int = 0
+
+    @property
+    def compliant(self):
+        return all(self.filled.get(label, 0) >= count for label, count in self.planned.items())
+
+
+# Function to expand a band label ("BL2", "BL4+", "BL4-BL5") to the level codes it covers
+def band_levels(label):
+    match = _LABEL.match(label.replace(" ", ""))
+    if not match:
+        raise ValueError(f"Unknown Bloom's level '{label}'. Use BL1 to BL6, a range like BL4-BL6, or BL4+.")
+    low = int(match.group(1))
+    high = 6 if match.group(2) else int(match.group(3) or low)
+    if high < low:
+        raise ValueError(f"Level range '{label}' runs backwards.")
+    return BLOOM_CODES[low - 1:high]
+
+
+# Function to read a blueprint such as "BL1: 20, BL2: 30, BL3: 30, BL4+: 20"; shares must add up to 100
+def parse_blueprint(text):
+    bands = []
+    covered = set()
+    for entry in re.split(r"[,;\n]", text):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = _ENTRY.match(entry)
+        if not match:
+            raise ValueError(f"Can't read blueprint entry '{entry}'. Write entries like 'BL2: 30' or 'BL4+: 20'.")
+        label = entry.split(":")[0].split("=")[0].replace(" ", "").upper()
+        levels = band_levels(label)
+        overlap = covered.intersection(levels)
+        if overlap:
+            raise ValueError(f"{', '.join(sorted(overlap))} appears in more than one blueprint entry.")
+        covered.update(levels)
+        share = float(match.group(4))
+        if share > 0:
+            bands.append(Band(label, levels, share))
+    if not bands:
+        raise ValueError("The blueprint is empty.")
+    total = sum(band.share for band in bands)
+    if abs(total - 100) > 0.01:
+        raise ValueError(f"Blueprint shares add up to {total:g}%, not 100%.")
+    return sorted(bands, key=lambda band: band.levels[0])
+
+
+# Function to turn the blueprint's percentages into exact slot counts for a section (largest remainder)
+def plan_slots(bands, count):
+    return {band.label: slots for band, slots in zip(bands, allocate_counts([band.share for band in bands], count, at_least_one=False))}
+
+
+# Function to pick the band a classified question fills: the band it was asked for when its level fits,
+# otherwise (when cross_fill is on) any other band its level fits that still has open slots
+def band_for(code, requested, bands, open_slots, cross_fill=False):
+    if code is None:
+        return None
+    for band in bands:
+        if band.label == requested and code in band.levels and open_slots.get(band.label, 0) > 0:
+            return band.label
+    if cross_fill:
+        for band in bands:
+            if code in band.levels and open_slots.get(band.label, 0) > 0:
+                return band.label
+    return None
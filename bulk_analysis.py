@@ -0,0 +1,197 @@
+import csv
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np  # type: ignore
+
+from bloom_classifier import LEVELS, levels_from_scores, score_questions
+
+# Questions sent to a worker process at a time
+BATCH_SIZE = 2000
+# Batches queued per worker; bounds memory however large the upload is
+BATCHES_IN_FLIGHT_PER_WORKER = 2
+# Rows kept for the on-screen preview; the full results go to a CSV on disk
+PREVIEW_ROWS = 1000
+# Column names recognised as holding the question text in an uploaded CSV
+QUESTION_COLUMNS = ("question", "questions", "question_text", "text", "stem")
+
+RESULT_FIELDS = ["Question", "Bloom's Level", "Confidence"]
+
+# Results CSVs of bulk analyses; one is deleted when its analysis is replaced or its session ends
+RESULTS_DIR = os.path.join(tempfile.gettempdir(), "qpg_bulk_results")
+# Files older than this were left by a server that stopped, and are swept up by the next analysis
+MAX_RESULTS_AGE = 24 * 60 * 60
+
+
+# Function to stream question texts from an uploaded file; yields (question, fraction_read)
+def iter_uploaded_questions(uploaded_file, name=None):
+    name = (name or getattr(uploaded_file, "name", "")).lower()
+    if name.endswith(".docx"):
+        yield from _iter_docx(uploaded_file)
+    elif name.endswith(".csv"):
+        yield from _iter_csv(uploaded_file)
+    else:
+        yield from _iter_text(uploaded_file)
+
+
+def _file_size(binary):
+    position = binary.tell()
+    size = binary.seek(0, os.SEEK_END)
+    binary.seek(position)
+    return size or 1
+
+
+def _iter_text(binary):
+    size = _file_size(binary)
+    text = io.TextIOWrapper(binary, encoding="utf-8", errors="replace", newline="")
+    try:
+        for line in text:
+            line = line.strip()
+            if line:
+                yield line, binary.tell() / size
+    finally:
+        # Leave the uploaded buffer open for Streamlit
+        text.detach()
+
+
+def _iter_csv(binary):
+    size = _file_size(binary)
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            return
+        names = [column.strip().lower() for column in header]
+        column = next((names.index(name) for name in QUESTION_COLUMNS if name in names), None)
+        if column is None:
+            # No recognisable header: treat the first row as data and use the first column
+            column = 0
+            if header and header[0].strip():
+                yield header[0].strip(), binary.tell() / size
+        for row in reader:
+            if column < len(row) and row[column].strip():
+                yield row[column].strip(), binary.tell() / size
+    finally:
+        text.detach()
+
+
+def _iter_docx(binary):
+    import docx  # type: ignore
+
+    paragraphs = docx.Document(binary).paragraphs
+    for index, paragraph in enumerate(paragraphs, start=1):
+        text = paragraph.text.strip()
+        if text:
+            yield text, index / len(paragraphs)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Runs in the worker processes
+def _score_batch(questions):
+    return score_questions(questions)
+
+
+# Function to classify a stream of (question, fraction_read) pairs on a process pool.
+# Yields (questions, scores, fraction_read) per batch, in input order, with a bounded number of batches in flight.
+def analyze_stream(items, workers=None, batch_size=BATCH_SIZE):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        # A pool on a single core only adds pickling and context switches
+        for batch in _batches(items, batch_size):
+            questions = [question for question, _ in batch]
+            yield questions, score_questions(questions), batch[-1][1]
+        return
+    pending = deque()
+    # Spawned, not forked: forking the threaded Streamlit server copies its held locks and open connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for batch in _batches(items, batch_size):
+            questions = [question for question, _ in batch]
+            pending.append((questions, batch[-1][1], executor.submit(_score_batch, questions)))
+            if len(pending) >= workers * BATCHES_IN_FLIGHT_PER_WORKER:
+                questions, progress, future = pending.popleft()
+                yield questions, future.result(), progress
+        while pending:
+            questions, progress, future = pending.popleft()
+            yield questions, future.result(), progress
+
+
+# Running totals for a bulk analysis: level counts, a capped preview and the full results on disk
+class BulkSummary:
+    def __init__(self, preview_rows=PREVIEW_ROWS):
+        self.counts = np.zeros(len(LEVELS), dtype=np.int64)
+        self.total = 0
+        self.preview = []
+        self.preview_rows = preview_rows
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        _sweep_stale_results()
+        results = tempfile.NamedTemporaryFile("w", suffix=".csv", dir=RESULTS_DIR, newline="", encoding="utf-8", delete=False)
+        self.results_path = results.name
+        self._results = results
+        self._writer = csv.writer(results)
+        self._writer.writerow(RESULT_FIELDS)
+        # Runs on discard(), or when the summary is garbage collected with its session's state, or at exit
+        self._cleanup = weakref.finalize(self, _delete_results, results, results.name)
+
+    def add(self, questions, scores):
+        classified = levels_from_scores(scores)
+        # Unmatched questions (all-zero rows) count as Remember, column 0, which argmax already gives
+        self.counts += np.bincount(scores.argmax(axis=1), minlength=len(LEVELS))
+        self.total += len(questions)
+        rows = [
+            (question, level, f"{confidence:.1f}%")
+            for question, (level, confidence) in zip(questions, classified)
+        ]
+        self._writer.writerows(rows)
+        room = self.preview_rows - len(self.preview)
+        if room > 0:
+            self.preview.extend(rows[:room])
+
+    def close(self):
+        self._results.close()
+
+    def read_results(self):
+        with open(self.results_path, "rb") as results:
+            return results.read()
+
+    # Delete the results file once the analysis is replaced
+    def discard(self):
+        self._cleanup()
+
+    # Level -> count for levels that occur, most common first (same shape as value_counts())
+    def level_counts(self):
+        order = np.argsort(-self.counts, kind="stable")
+        return {LEVELS[column]: int(self.counts[column]) for column in order if self.counts[column]}
+
+
+def _delete_results(results, path):
+    results.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _sweep_stale_results():
+    cutoff = time.time() - MAX_RESULTS_AGE
+    for entry in os.scandir(RESULTS_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            # Already removed by another session
+            pass
@@ -0,0 +1,147 @@
+import re
+import threading
+
+import numpy as np  # type: ignore
+
+# Duplicate check modes offered in the UI
+DEDUPE_OFF = "off"
+DEDUPE_PAPER = "paper"
+DEDUPE_HISTORY = "history"
+
+# Estimated Jaccard similarity of stem shingles above which two questions count as the same question
+SIMILARITY_THRESHOLD = 0.5
+# 64 MinHash permutations split into 32 bands of 2 rows. The LSH S-curve is centred near (1/32)^(1/2) = 0.18, well
+# below the threshold, so pairs at 0.5 become candidates with probability 1 - (1 - 0.5^2)^32 > 0.9999;
+# candidates are then checked against the threshold on their full signatures
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+# Character n-grams survive small rewordings better than whole words
+SHINGLE_SIZE = 5
+# Stems are signed in blocks so the (permutations x shingles) matrix stays small
+_BLOCK = 512
+
+# Multiply-shift hash family: (a * x + b) >> 32 with wrapping 64-bit arithmetic, a odd
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 1 << 63, size=(NUM_PERM, 1), dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 1 << 63, size=(NUM_PERM, 1), dtype=np.uint64)
+_SHIFT = np.uint64(32)
+_WINDOW_WEIGHTS = np.array([1 << (8 * i) for i in reversed(range(SHINGLE_SIZE))], dtype=np.uint64)
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _shingles(texts):
+    # Normalise every text, then take all 5-byte windows of the joined buffer in one vectorised pass
+    encoded = [(" " + _NON_WORD.sub(" ", text.lower()).strip() + " ").encode("utf-8").ljust(SHINGLE_SIZE) for text in texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    # Each window packed into one integer is the shingle itself; no per-shingle hashing needed
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE).astype(np.uint64) @ _WINDOW_WEIGHTS
+    counts = lengths - SHINGLE_SIZE + 1
+    offsets = np.cumsum(counts) - counts
+    # Keep only windows that lie inside a single text
+    starts = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+    return windows[positions], offsets
+
+
+# Function to compute MinHash signatures for many texts at once; returns a (len(texts), NUM_PERM) array
+def signatures(texts):
+    result = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(texts), _BLOCK):
+        shingles, offsets = _shingles(texts[start:start + _BLOCK])
+        hashed = (_A * shingles[None, :] + _B) >> _SHIFT
+        # Row-wise minimum over each text's shingles in a single pass
+        result[start:start + len(offsets)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return result
+
+
+# Banded LSH index over MinHash signatures: near-duplicate lookups touch only colliding buckets
+class NearDuplicateIndex:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.texts = []
+        self._signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._pending = []
+        self._buckets = [{} for _ in range(BANDS)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, texts, sigs=None):
+        sigs = signatures(texts) if sigs is None else sigs
+        with self._lock:
+            base = len(self.texts)
+            self.texts.extend(texts)
+            self._pending.append(sigs)
+            for offset, signature in enumerate(sigs):
+                for band, bucket in enumerate(self._buckets):
+                    bucket.setdefault(signature[band * ROWS:(band + 1) * ROWS].tobytes(), []).append(base + offset)
+
+    def _all_signatures(self):
+        if self._pending:
+            self._signatures = np.vstack([self._signatures] + self._pending)
+            self._pending = []
+        return self._signatures
+
+    # Function to find the closest stored text at or above the threshold; returns (text, similarity) or None
+    def match(self, signature):
+        with self._lock:
+            candidates = set()
+            for band, bucket in enumerate(self._buckets):
+                candidates.update(bucket.get(signature[band * ROWS:(band + 1) * ROWS].tobytes(), ()))
+            if not candidates:
+                return None
+            ids = np.fromiter(candidates, dtype=np.int64)
+            similarity = (self._all_signatures()[ids] == signature).mean(axis=1)
+            best = int(similarity.argmax())
+            if similarity[best] < self.threshold:
+                return None
+            return self.texts[ids[best]], float(similarity[best])
+
+
+# Within-paper (and optionally cross-paper) duplicate check; accepted stems join the paper index
+class DuplicateFilter:
+    def __init__(self, existing_stems=(), history=None):
+        self.paper = NearDuplicateIndex()
+        self.history = history
+        if existing_stems:
+            self.paper.add(list(existing_stems))
+
+    # Function to check questions in order; returns one flag per question, True when it is kept
+    def accept(self, questions):
+        if not questions:
+            return []
+        flags = []
+        for question, signature in zip(questions, signatures([question.stem for question in questions])):
+            duplicate = self.paper.match(signature) or (self.history is not None and self.history.match(signature))
+            if not duplicate:
+                self.paper.add([question.stem], signature[None, :])
+            flags.append(not duplicate)
+        return flags
+
+
+_history = {}
+_history_lock = threading.Lock()
+
+
+# Function to get the process-wide index of earlier questions for a subject, loading it once from `load_stems`
+def history_index(subject_key, load_stems):
+    with _history_lock:
+        index = _history.get(subject_key)
+        if index is None:
+            index = NearDuplicateIndex()
+            stems = load_stems()
+            if stems:
+                index.add(stems)
+            _history[subject_key] = index
+        return index
+
+
+# Function to add newly stored stems to a subject's history index, if that index has been loaded
+def extend_history(subject_key, stems):
+    with _history_lock:
+        index = _history.get(subject_key)
+    if index is not None and stems:
+        index.add(list(stems))
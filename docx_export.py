@@ -0,0 +1,195 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import docx  # type: ignore
+from docx.shared import Inches, Pt  # type: ignore
+
+import telemetry
+from question_parser import parse_questions
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MIME = "application/zip"
+
+# Heading for each generated section, in paper order
+SECTION_HEADINGS = {
+    "mcq_questions": "Generated MCQ Questions",
+    "short_questions": "Generated Short Answer Questions",
+    "long_questions": "Generated Long Answer Questions",
+}
+
+# Rendered documents kept in memory, keyed by content hash; reruns with unchanged content reuse the bytes
+MAX_CACHED_DOCUMENTS = 32
+# Papers queued per ZIP worker; bounds how many rendered documents are held at once
+ZIP_PAPERS_IN_FLIGHT_PER_WORKER = 2
+# ZIPs built from the UI; one is deleted when it is replaced or its session ends
+ZIP_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "qpg_zip_exports")
+# ZIPs older than this were left by a server that stopped, and are swept up by the next export
+MAX_ZIP_EXPORT_AGE = 24 * 60 * 60
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# ZIP exports started from the UI run here, off the script thread
+_zip_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zip-export")
+
+
+# Function to fingerprint a paper's content; identical sections and title give the same key
+def document_key(sections, title=None):
+    payload = json.dumps(
+        {"title": title or "", "sections": {section: sections.get(section) or "" for section in SECTION_HEADINGS}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _add_section(doc, section, text):
+    questions = parse_questions(text, section)
+    if not questions:
+        # Output the parser can't read (no "Q1." markers) is kept as it was written
+        doc.add_paragraph(text)
+        return
+    for number, question in enumerate(questions, start=1):
+        paragraph = doc.add_paragraph()
+        paragraph.paragraph_format.space_before = Pt(6)
+        paragraph.add_run(f"Q{number}. ").bold = True
+        paragraph.add_run(question.stem)
+        if question.bloom:
+            paragraph.add_run(f" [{question.bloom}]").italic = True
+        for letter, option in zip("abcd", question.options):
+            option_paragraph = doc.add_paragraph(f"({letter}) {option}")
+            option_paragraph.paragraph_format.left_indent = Inches(0.4)
+            option_paragraph.paragraph_format.space_after = Pt(0)
+
+
+# Function to lay out the generated sections as a Word document, one numbered paragraph per question
+def build_document(sections, title=None):
+    doc = docx.Document()
+    if title:
+        doc.add_heading(title, level=0)
+    for section, heading in SECTION_HEADINGS.items():
+        if sections.get(section):
+            doc.add_heading(heading, level=1)
+            _add_section(doc, section, sections[section])
+    return doc
+
+
+def _render(sections, title=None):
+    doc_io = BytesIO()
+    build_document(sections, title).save(doc_io)
+    return doc_io.getvalue()
+
+
+# Function to render the generated sections to DOCX bytes, reusing the last render of identical content
+def document_bytes(sections, title=None):
+    key = document_key(sections, title)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            telemetry.increment("qpg_docx_builds_total", cache="hit")
+            return _cache[key]
+    telemetry.increment("qpg_docx_builds_total", cache="miss")
+    with telemetry.timed("qpg_docx_build_seconds", "docx_build") as fields:
+        data = _render(sections, title)
+        fields["bytes"] = len(data)
+    with _cache_lock:
+        _cache[key] = data
+        while len(_cache) > MAX_CACHED_DOCUMENTS:
+            _cache.popitem(last=False)
+    return data
+
+
+# Runs in the ZIP worker processes
+def _render_paper(paper):
+    name, sections, title = paper
+    return name, _render(sections, title)
+
+
+def _unique_name(name, used):
+    base, extension = os.path.splitext(name)
+    candidate, number = name, 1
+    while candidate in used:
+        number += 1
+        candidate = f"{base}_{number}{extension}"
+    used.add(candidate)
+    return candidate
+
+
+# Function to write many papers into one ZIP file; `papers` yields (file_name, sections, title).
+# Documents are rendered on a process pool and written as they arrive, so only a few are in memory at once.
+def write_zip(papers, path, workers=None):
+    workers = workers or os.cpu_count() or 1
+    used = set()
+    count = 0
+    # DOCX files are already compressed, so they are stored rather than deflated again
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        if workers == 1:
+            for paper in papers:
+                name, data = _render_paper(paper)
+                archive.writestr(_unique_name(name, used), data)
+                count += 1
+            return count
+        pending = deque()
+        # Spawned, not forked: forking the threaded Streamlit server copies its held locks and open connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            for paper in papers:
+                pending.append(executor.submit(_render_paper, paper))
+                if len(pending) >= workers * ZIP_PAPERS_IN_FLIGHT_PER_WORKER:
+                    name, data = pending.popleft().result()
+                    archive.writestr(_unique_name(name, used), data)
+                    count += 1
+            while pending:
+                name, data = pending.popleft().result()
+                archive.writestr(_unique_name(name, used), data)
+                count += 1
+    return count
+
+
+# A ZIP built in the background into ZIP_EXPORT_DIR; `future`'s result is the number of papers written
+class ZipExport:
+    def __init__(self, papers, workers=None):
+        os.makedirs(ZIP_EXPORT_DIR, exist_ok=True)
+        _sweep_stale_exports()
+        handle, self.path = tempfile.mkstemp(suffix=".zip", dir=ZIP_EXPORT_DIR)
+        os.close(handle)
+        self.future = _zip_executor.submit(write_zip, list(papers), self.path, workers)
+        # Runs on discard(), or when the export is garbage collected with its session's state, or at exit
+        self._cleanup = weakref.finalize(self, _delete_export, self.future, self.path)
+
+    def read(self):
+        with open(self.path, "rb") as archive:
+            return archive.read()
+
+    # Delete the ZIP once the export is replaced
+    def discard(self):
+        self._cleanup()
+
+
+def _delete_export(future, path):
+    # A build that has started would write the file again, so it is deleted once the build is over
+    future.cancel()
+    future.add_done_callback(lambda _: _remove(path))
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _sweep_stale_exports():
+    cutoff = time.time() - MAX_ZIP_EXPORT_AGE
+    for entry in os.scandir(ZIP_EXPORT_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            # Already removed by another session
+            pass
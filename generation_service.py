@@ -0,0 +1,221 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import telemetry
+from rate_limiter import RateLimiter
+
+# LLM calls in flight at once across every session in the process; override with QPG_MAX_CONCURRENT_CALLS
+MAX_CONCURRENT_CALLS = int(os.getenv("QPG_MAX_CONCURRENT_CALLS", 8))
+# Optional process-wide pacing (requests and tokens per minute); off unless both are set
+REQUESTS_PER_MINUTE = int(os.getenv("QPG_RPM", 0))
+TOKENS_PER_MINUTE = int(os.getenv("QPG_TPM", 0))
+
+ANONYMOUS = "anonymous"
+# Who the current calls are made for; set once per script run and carried into worker threads by submit()
+_current_user = contextvars.ContextVar("qpg_user", default=ANONYMOUS)
+# Optional check run before each call of the current work starts, e.g. to stop a cancelled background job;
+# it stops the work by raising
+_call_check = contextvars.ContextVar("qpg_call_check", default=None)
+
+
+def set_user(user):
+    _current_user.set(user or ANONYMOUS)
+
+
+def current_user():
+    return _current_user.get()
+
+
+def set_call_check(check):
+    _call_check.set(check)
+
+
+# Function to run the current work's check before it starts a call. It runs before joining a flight, never inside
+# one, so stopping one session's work can't fail the calls other sessions share with it.
+def _check_call():
+    check = _call_check.get()
+    if check is not None:
+        check()
+
+
+# Function to submit work to an executor so it runs as the submitting user
+def submit(executor, fn, *args):
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+# Concurrency limit with one FIFO queue per user, served round-robin: a user with many queued calls
+# gets one slot per turn, so everyone else's calls still start in between
+class FairScheduler:
+    def __init__(self, limit=MAX_CONCURRENT_CALLS):
+        self.limit = limit
+        self.active = 0
+        self._queues = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, user):
+        ticket = threading.Event()
+        started = time.perf_counter()
+        with self._lock:
+            if self.active < self.limit and not self._queues:
+                self.active += 1
+                ticket.set()
+            else:
+                self._queues.setdefault(user, deque()).append(ticket)
+        ticket.wait()
+        telemetry.observe("qpg_llm_queue_seconds", time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            if not self._queues:
+                self.active -= 1
+                return
+            # Hand the slot straight to the next user in turn, then send that user to the back of the line
+            user, waiting = next(iter(self._queues.items()))
+            ticket = waiting.popleft()
+            if waiting:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+        ticket.set()
+
+    def waiting(self):
+        with self._lock:
+            return {user: len(waiting) for user, waiting in self._queues.items()}
+
+
+# One LLM call and everyone waiting on it; streamed chunks are kept so late joiners replay them from the start
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self._changed = threading.Condition()
+
+    def push(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def land(self, result=None, error=None):
+        with self._changed:
+            self.result, self.error, self.done = result, error, True
+            self._changed.notify_all()
+
+    def wait(self):
+        with self._changed:
+            self._changed.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self.done or len(self.chunks) > position)
+                chunks = self.chunks[position:]
+                done, error = self.done, self.error
+            position += len(chunks)
+            yield from chunks
+            if done and position >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+# Process-wide entry point for LLM calls, shared by every Streamlit session: identical requests in flight at the
+# same time share one call (single flight), calls start through the fair scheduler, and each attempt is paced
+# by the optional rate limiter
+class GenerationService:
+    def __init__(self, max_concurrent=MAX_CONCURRENT_CALLS, limiter=None):
+        self.scheduler = FairScheduler(max_concurrent)
+        self.limiter = limiter
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _land(self, key, flight, result=None, error=None):
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.land(result, error)
+
+    # Function to wait for the rate limiter, if one is set, before one LLM call. Callers pace every call they
+    # make, failovers and retries included, since each one counts against the API's limits.
+    def pace(self, tokens):
+        if self.limiter is not None:
+            self.limiter.acquire(tokens)
+
+    # Function to run call() once for everyone asking for `key` right now; on_done(result) runs once, before any
+    # waiter is released. Returns (result, shared), shared being True when another caller's request was joined.
+    def invoke(self, key, call, on_done=None):
+        _check_call()
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.wait(), True
+        try:
+            with self.scheduler.slot(current_user()):
+                result = call()
+            if on_done is not None:
+                on_done(result)
+        except BaseException as exc:
+            self._land(key, flight, error=exc)
+            raise
+        self._land(key, flight, result=result)
+        return result, False
+
+    # Function to stream call() once for everyone asking for `key` right now. The stream is read on its own thread,
+    # so a session that stops reading (e.g. a rerun) never stalls the others. on_done receives the summed chunks.
+    # Returns (chunk iterator, shared).
+    def stream(self, key, call, on_done=None):
+        _check_call()
+        flight, leader = self._join(key)
+        if leader:
+            threading.Thread(
+                target=self._run_stream, args=(key, flight, call, on_done, current_user()),
+                name="llm-stream", daemon=True,
+            ).start()
+        return iter(flight), not leader
+
+    def _run_stream(self, key, flight, call, on_done, user):
+        message = None
+        try:
+            with self.scheduler.slot(user):
+                for chunk in call():
+                    flight.push(chunk)
+                    message = chunk if message is None else message + chunk
+            if on_done is not None and message is not None:
+                on_done(message)
+        except BaseException as exc:
+            self._land(key, flight, error=exc)
+            return
+        self._land(key, flight, result=message)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+def _limiter_from_env():
+    if REQUESTS_PER_MINUTE and TOKENS_PER_MINUTE:
+        return RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    return None
+
+
+generation_service = GenerationService(MAX_CONCURRENT_CALLS, _limiter_from_env())
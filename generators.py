@@ -0,0 +1,723 @@
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import httpx  # type: ignore
+from dotenv import load_dotenv
+from langchain_core.prompts import ChatPromptTemplate  # type: ignore
+from langchain_groq import ChatGroq  # type: ignore
+
+from bloom_classifier import LEVEL_CODES, classify_questions
+from blueprint import BlueprintResult, band_for, band_levels, parse_blueprint, plan_slots
+from dedupe import DEDUPE_HISTORY, DEDUPE_OFF, DEDUPE_PAPER, DuplicateFilter, extend_history, history_index
+from generation_service import generation_service, submit
+from llm_cache import ResponseCache, make_cache_key
+from model_router import ModelRouter
+from question_bank import QuestionBank, subject_key
+from question_parser import QuestionStreamParser, format_questions, iter_questions, parse_questions
+from sharding import DEFAULT_BATCH_SIZE, generate_sharded, split_questions
+import telemetry
+from syllabus import MAX_SYLLABUS_CHARS, fit_syllabus
+from token_budget import TokenBudgetError, TokenEstimator, usable_tokens
+
+load_dotenv()
+
+MODEL_NAME = "llama3-70b-8192"  # Or any valid Groq model
+# Smaller, faster model tried first for small short/long answer requests, and the fallback for the main one;
+# set QPG_FAST_MODEL to an empty value to use MODEL_NAME only
+FAST_MODEL_NAME = os.getenv("QPG_FAST_MODEL", "llama3-8b-8192")
+# A call that takes longer than this fails over to the other model
+REQUEST_TIMEOUT_SECONDS = 60
+# Retries the Groq client makes itself on a 429 or timeout; past that, the call is better spent on the other model
+CLIENT_MAX_RETRIES = 1
+
+# Pooled HTTP connections shared by every session and worker thread in the process
+MAX_CONNECTIONS = 20
+
+# Prompt templates per question type. Values are filled in by the prompt template at call time,
+# so braces inside a subject or syllabus are passed through untouched.
+PROMPT_TEMPLATES = {
+    "mcq": """
+    You are an expert in Bloom's Taxonomy and question generation. Based on the inputs below, generate {num_questions} multiple-choice questions (MCQs) using the following format.
+
+    Use the following short codes for Bloom’s levels:
+
+    BL1: Remember
+    BL2: Understand
+    BL3: Apply
+    BL4: Analyze
+    BL5: Evaluate
+    BL6: Create
+
+    {level_instruction}
+    {exclusion_instruction}
+
+    Format:
+    Q1. What is the capital of France? [BL1]
+    (a) Berlin (b) Madrid (c) Paris (d) Rome
+
+    Do NOT provide answers. Only questions.
+
+    Subject: {subject_name}
+    Syllabus: {syllabus}
+    """,
+    "short": """
+    You are an expert in Bloom's Taxonomy and question generation. Generate {num_questions} short answer questions using Bloom's short codes:
+
+    BL1: Remember
+    BL2: Understand
+    BL3: Apply
+    BL4: Analyze
+    BL5: Evaluate
+    BL6: Create
+
+    {level_instruction}
+    {exclusion_instruction}
+
+    Format:
+    Q1. Explain the process of normalization. [BL2]
+
+    Do NOT provide answers. Only questions.
+
+    Subject: {subject_name}
+    Syllabus: {syllabus}
+    """,
+    "long": """
+    You are an expert in Bloom's Taxonomy and question generation. Generate {num_questions} long answer questions using Bloom's short codes:
+
+    BL1: Remember
+    BL2: Understand
+    BL3: Apply
+    BL4: Analyze
+    BL5: Evaluate
+    BL6: Create
+
+    {level_instruction}
+    {exclusion_instruction}
+
+    Format:
+    Q1. Design and implement a compiler for a toy language. [BL6]
+
+    Do NOT provide answers. Only questions.
+
+    Subject: {subject_name}
+    Syllabus: {syllabus}
+    """,
+}
+
+# Most existing stems quoted back to the model when asking for replacement questions
+MAX_EXCLUSIONS = 30
+# Rounds of replacement requests for questions rejected as near-duplicates
+MAX_REPLACEMENT_ROUNDS = 2
+# Rounds of regeneration for blueprint slots whose questions classify at the wrong level
+MAX_BLUEPRINT_REPAIR_ROUNDS = 3
+
+# Session state key for each question type
+SECTION_KEYS = {
+    "mcq": "mcq_questions",
+    "short": "short_questions",
+    "long": "long_questions",
+}
+
+response_cache = ResponseCache()
+question_bank = QuestionBank()
+
+
+# Router installed with set_router() or set_llm(), e.g. the stub used for offline batch runs
+_router_override = None
+
+
+# Function to get the router that picks a model per request; the Groq one is built once per process
+def get_router():
+    if _router_override is not None:
+        return _router_override
+    return groq_router()
+
+
+# Function to swap in another router, e.g. one over several stand-in models; pass None to go back to Groq
+def set_router(router):
+    global _router_override
+    _router_override = router
+    _chain.cache_clear()
+
+
+# Function to swap in a single chat model (such as stub_llm.StubChatModel); pass None to go back to Groq
+def set_llm(llm):
+    set_router(None if llm is None else ModelRouter({llm.model_name: llm}, llm.model_name))
+
+
+# Function to get the client for a model, by default the primary one; Streamlit reruns and worker threads all reuse it
+def get_llm(model=None):
+    return get_router().client(model)
+
+
+# Function to build the router over the Groq models once per process (per retry setting); callers with their own
+# retry loop pass max_retries=0
+@lru_cache(maxsize=None)
+def groq_router(max_retries=CLIENT_MAX_RETRIES):
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("GROQ_API_KEY environment variable is not set. Please set it before running the app.")
+    http_client = httpx.Client(limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS))
+    models = [MODEL_NAME] + ([FAST_MODEL_NAME] if FAST_MODEL_NAME and FAST_MODEL_NAME != MODEL_NAME else [])
+    clients = {
+        model: ChatGroq(api_key=api_key, model=model, http_client=http_client, max_retries=max_retries, timeout=REQUEST_TIMEOUT_SECONDS)
+        for model in models
+    }
+    return ModelRouter(clients, MODEL_NAME, FAST_MODEL_NAME)
+
+
+# Function to get the token estimator for a model (the primary one by default); each model calibrates separately
+def get_token_estimator(model=None):
+    return _token_estimator(get_llm(model).model_name)
+
+
+@lru_cache(maxsize=None)
+def _token_estimator(model):
+    return TokenEstimator(model)
+
+
+# Function to get the chain for a question type on a model (the primary one by default); it returns the model's
+# message so usage can be read
+def get_chain(question_type, model=None):
+    return _chain(question_type, model or get_router().primary)
+
+
+# Built once per process for each question type and model
+@lru_cache(maxsize=None)
+def _chain(question_type, model):
+    return ChatPromptTemplate.from_template(PROMPT_TEMPLATES[question_type]) | get_llm(model)
+
+
+def level_instruction(bl_level):
+    if bl_level == "Random (All Levels)":
+        return "Generate questions across all Bloom's levels."
+    levels = band_levels(bl_level)
+    if len(levels) > 1:
+        # A blueprint band such as "BL4+"
+        return f"Generate ONLY {' or '.join(levels)} level questions."
+    return f"Generate ONLY {bl_level} level questions."
+
+
+# Function to ask the model not to repeat questions the paper already has. Only the last MAX_EXCLUSIONS are
+# quoted, so callers list the stems that matter most last.
+def exclusion_instruction(exclusions):
+    if not exclusions:
+        return ""
+    listed = "\n".join(f"- {stem}" for stem in exclusions[-MAX_EXCLUSIONS:])
+    return f"Do NOT repeat or paraphrase any of these existing questions:\n{listed}"
+
+
+def _prompt_variables(subject_name, syllabus, count, bl_level, exclusions=None):
+    return {
+        "subject_name": subject_name,
+        "syllabus": syllabus,
+        "num_questions": count,
+        "level_instruction": level_instruction(bl_level),
+        "exclusion_instruction": exclusion_instruction(exclusions),
+    }
+
+
+def _render_prompt(question_type, variables):
+    return PROMPT_TEMPLATES[question_type].format(**variables)
+
+
+# Function to name the model a request goes to first; budgets and cache keys are worked out for it
+def _preferred_model(question_type, variables):
+    return get_router().preferred(question_type, variables["num_questions"])[0]
+
+
+# Function to make a request fit the model's context window before it is sent.
+# Returns the (possibly trimmed) variables and the question counts to ask for per call.
+def _fit_budget(question_type, variables):
+    model = _preferred_model(question_type, variables)
+    llm = get_llm(model)
+    estimator = get_token_estimator(model)
+    count = variables["num_questions"]
+    try:
+        return variables, estimator.split_count(question_type, _render_prompt(question_type, variables), count, llm.max_tokens)
+    except TokenBudgetError:
+        pass
+    # The prompt alone is too big: drop the exclusion list, then cut the syllabus down to what leaves room for a batch
+    trimmed = {**variables, "exclusion_instruction": ""}
+    overhead = estimator.prompt_tokens(_render_prompt(question_type, {**trimmed, "syllabus": ""}))
+    room = usable_tokens(estimator.context_window) - overhead - estimator.completion_tokens(question_type, min(count, DEFAULT_BATCH_SIZE))
+    if room > 0:
+        trimmed["syllabus"] = fit_syllabus(variables["syllabus"], int(room * estimator.chars_per_token))
+    return trimmed, estimator.split_count(question_type, _render_prompt(question_type, trimmed), count, llm.max_tokens)
+
+
+def _record_usage(question_type, variables, message, model):
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    questions = len(split_questions(message.content)) or variables["num_questions"]
+    prompt_chars = len(_render_prompt(question_type, variables))
+    get_token_estimator(model).record(question_type, questions, prompt_chars, usage["input_tokens"], usage["output_tokens"])
+
+
+def _record_call(question_type, message, started, cache, model, first_token_at=None, streamed=False):
+    usage = getattr(message, "usage_metadata", None) or {}
+    telemetry.record_llm_call(
+        question_type,
+        model,
+        time.perf_counter() - started,
+        cache,
+        first_token_seconds=None if first_token_at is None else first_token_at - started,
+        prompt_tokens=usage.get("input_tokens"),
+        completion_tokens=usage.get("output_tokens"),
+        streamed=streamed,
+    )
+
+
+def _cache_key(question_type, variables, shard):
+    llm = get_llm(_preferred_model(question_type, variables))
+    prompt = _render_prompt(question_type, variables)
+    # The shard index keeps identical batch prompts of one sharded request from sharing a cache entry
+    return make_cache_key(prompt, llm.model_name, {"temperature": llm.temperature, "max_tokens": llm.max_tokens, "shard": shard})
+
+
+def _estimated_tokens(question_type, variables):
+    model = _preferred_model(question_type, variables)
+    return get_token_estimator(model).estimate(question_type, _render_prompt(question_type, variables), variables["num_questions"]).total
+
+
+# Function to make the per-model call the router runs; every attempt, failovers included, waits for the rate limiter
+def _attempt(question_type, variables, stream=False):
+    tokens = _estimated_tokens(question_type, variables)
+
+    def call(model):
+        generation_service.pace(tokens)
+        chain = get_chain(question_type, model)
+        return chain.stream(variables) if stream else chain.invoke(variables)
+
+    return call
+
+
+# Function to run once per completed llm call, however many sessions shared it
+def _on_completion(question_type, variables, key):
+    def done(message, model):
+        _record_usage(question_type, variables, message, model)
+        response_cache.set(key, message.content)
+
+    return done
+
+
+def _invoke(question_type, variables, use_cache, shard):
+    started = time.perf_counter()
+    key = _cache_key(question_type, variables, shard)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            _record_call(question_type, None, started, "hit", _preferred_model(question_type, variables))
+            return cached
+    done = _on_completion(question_type, variables, key)
+    # Identical requests from other sessions that are already in flight are joined rather than sent again;
+    # the router picks the model and fails over to the next one on a 429 or timeout
+    (message, model), shared = generation_service.invoke(
+        key,
+        lambda: get_router().invoke(question_type, variables["num_questions"], _attempt(question_type, variables)),
+        lambda routed: done(*routed),
+    )
+    _record_call(question_type, message, started, "coalesced" if shared else "miss" if use_cache else "bypass", model)
+    return message.content
+
+
+def _stream(question_type, variables, use_cache, shard):
+    started = time.perf_counter()
+    key = _cache_key(question_type, variables, shard)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            _record_call(question_type, None, started, "hit", _preferred_model(question_type, variables), streamed=True)
+            yield cached
+            return
+    done = _on_completion(question_type, variables, key)
+    routed = get_router().stream(question_type, variables["num_questions"], _attempt(question_type, variables, stream=True))
+    chunks, shared = generation_service.stream(key, lambda: routed, lambda message: done(message, routed.model))
+    message = None
+    first_token_at = None
+    for chunk in chunks:
+        if first_token_at is None and chunk.content:
+            first_token_at = time.perf_counter()
+        # Chunks add up to the full message, including the usage reported with the last one
+        message = chunk if message is None else message + chunk
+        yield chunk.content
+    if message is not None:
+        # A joined stream was routed by the session that started it; it's booked under the preferred model
+        model = (None if shared else routed.model) or _preferred_model(question_type, variables)
+        _record_call(question_type, message, started, "coalesced" if shared else "miss" if use_cache else "bypass", model, first_token_at, streamed=True)
+
+
+# Function to generate questions of one type; with stream=True it returns an iterator of text chunks
+def generate_questions(question_type, subject_name, syllabus, count, bl_level, use_cache=True, shard=None, stream=False, exclusions=None):
+    variables, counts = _fit_budget(question_type, _prompt_variables(subject_name, syllabus, count, bl_level, exclusions))
+    if len(counts) > 1:
+        # More questions than one completion can hold: spread them over batches that each fit
+        text = generate_sharded(
+            lambda subject_name, syllabus, count, bl_level, shard=None, outer=shard: generate_questions(
+                question_type, subject_name, syllabus, count, bl_level, use_cache,
+                shard if outer is None else (outer, shard), exclusions=exclusions,
+            ),
+            subject_name, variables["syllabus"], count, bl_level, batch_size=counts[0],
+        )
+        return iter([text]) if stream else text
+    if stream:
+        return _stream(question_type, variables, use_cache, shard)
+    return _invoke(question_type, variables, use_cache, shard)
+
+
+# Function to generate MCQs
+def generate_mcq_questions(subject_name, syllabus, num_mcq, bl_level, use_cache=True, shard=None, stream=False):
+    return generate_questions("mcq", subject_name, syllabus, num_mcq, bl_level, use_cache, shard, stream)
+
+
+# Function to generate short answer questions
+def generate_short_questions(subject_name, syllabus, num_short, bl_level, use_cache=True, shard=None, stream=False):
+    return generate_questions("short", subject_name, syllabus, num_short, bl_level, use_cache, shard, stream)
+
+
+# Function to generate long answer questions
+def generate_long_questions(subject_name, syllabus, num_long, bl_level, use_cache=True, shard=None, stream=False):
+    return generate_questions("long", subject_name, syllabus, num_long, bl_level, use_cache, shard, stream)
+
+
+# A long syllabus is always generated topic by topic so no prompt overflows the context window
+def needs_topic_split(syllabus, count, sharded):
+    return (sharded and count > DEFAULT_BATCH_SIZE) or len(syllabus) > MAX_SYLLABUS_CHARS
+
+
+def _generate_text(question_type, subject_name, syllabus, count, bl_level, sharded, use_cache):
+    def generator(subject_name, syllabus, count, bl_level, shard=None):
+        return generate_questions(question_type, subject_name, syllabus, count, bl_level, use_cache, shard)
+
+    if needs_topic_split(syllabus, count, sharded):
+        return generate_sharded(generator, subject_name, syllabus, count, bl_level)
+    return generator(subject_name, syllabus, count, bl_level)
+
+
+def _stream_text(question_type, subject_name, syllabus, count, bl_level, sharded, use_cache):
+    if count <= 0:
+        return
+    # Sharded requests are merged before they are shown, so they arrive as one chunk
+    if needs_topic_split(syllabus, count, sharded):
+        yield _generate_text(question_type, subject_name, syllabus, count, bl_level, sharded, use_cache)
+    else:
+        yield from generate_questions(question_type, subject_name, syllabus, count, bl_level, use_cache, stream=True)
+
+
+def _duplicate_filter(subject_name, reused, dedupe):
+    if dedupe == DEDUPE_OFF:
+        return None
+    history = None
+    if dedupe == DEDUPE_HISTORY:
+        history = history_index(subject_key(subject_name), lambda: question_bank.stems(subject_name))
+    return DuplicateFilter([question.stem for question in reused], history)
+
+
+def _generate_replacements(question_type, subject_name, syllabus, count, bl_level, duplicate_filter, exclusions):
+    section = SECTION_KEYS[question_type]
+    replacements = []
+    for _ in range(MAX_REPLACEMENT_ROUNDS):
+        missing = count - len(replacements)
+        if missing <= 0:
+            break
+        # Always a fresh completion: the cached answer would bring the same duplicates back
+        text = generate_questions(
+            question_type, subject_name, fit_syllabus(syllabus), missing, bl_level, use_cache=False,
+            exclusions=exclusions + [question.stem for question in replacements],
+        )
+        candidates = parse_questions(text, section)[:missing]
+        replacements += [question for question, keep in zip(candidates, duplicate_filter.accept(candidates)) if keep]
+    return replacements
+
+
+# Function to regenerate chosen questions of a section without touching the rest. Only the rejected slots are
+# requested; the kept questions and the rejected ones are passed as exclusions and screened out as near-duplicates.
+# Each slot keeps its own Bloom's level unless a single level is selected. Returns {position: new question};
+# positions that could not be refilled are left out, so the old question stays.
+def regenerate_questions(question_type, subject_name, syllabus, questions, positions, bl_level, dedupe=DEDUPE_PAPER):
+    positions = sorted(set(positions))
+    stems = [question.stem for question in questions]
+    history = None
+    if dedupe == DEDUPE_HISTORY:
+        history = history_index(subject_key(subject_name), lambda: question_bank.stems(subject_name))
+    duplicate_filter = DuplicateFilter(stems, history)
+    by_level = {}
+    for position in positions:
+        level = bl_level
+        if bl_level == "Random (All Levels)" and questions[position].bloom:
+            level = questions[position].bloom
+        by_level.setdefault(level, []).append(position)
+    # The questions being replaced go after the kept ones, so a long section can't push them out of the prompt
+    chosen = set(positions)
+    kept = [stem for position, stem in enumerate(stems) if position not in chosen]
+    replaced = [stems[position] for position in positions]
+    replacements = {}
+    for level, level_positions in by_level.items():
+        exclusions = kept + replaced + [question.stem for question in replacements.values()]
+        generated = _generate_replacements(question_type, subject_name, syllabus, len(level_positions), level, duplicate_filter, exclusions)
+        replacements.update(zip(level_positions, generated))
+    _store(subject_name, syllabus, question_type, list(replacements.values()))
+    return replacements
+
+
+def _store(subject_name, syllabus, question_type, questions):
+    question_bank.add(subject_name, syllabus, question_type, questions)
+    extend_history(subject_key(subject_name), [question.stem for question in questions])
+
+
+# Function to generate one section: bank questions first (when use_bank is on), then the shortfall from the llm,
+# split into parallel batches when sharded mode is on. Near-duplicates are dropped and only those slots regenerated.
+def run_section(question_type, subject_name, syllabus, count, bl_level, sharded=False, use_cache=True, use_bank=False, dedupe=DEDUPE_PAPER):
+    section = SECTION_KEYS[question_type]
+    reused = question_bank.take(subject_name, syllabus, question_type, bl_level, count) if use_bank else []
+    shortfall = count - len(reused)
+    text = _generate_text(question_type, subject_name, syllabus, shortfall, bl_level, sharded, use_cache) if shortfall > 0 else ""
+    generated = parse_questions(text, section)[:max(shortfall, 0)]
+    duplicate_filter = _duplicate_filter(subject_name, reused, dedupe)
+    replaced = False
+    if duplicate_filter is not None:
+        keep = duplicate_filter.accept(generated)
+        rejected = [position for position, kept in enumerate(keep) if not kept]
+        if rejected:
+            accepted = [question for question, kept in zip(generated, keep) if kept]
+            exclusions = [question.stem for question in reused + accepted]
+            replacements = _generate_replacements(question_type, subject_name, syllabus, len(rejected), bl_level, duplicate_filter, exclusions)
+            # Splice replacements into the rejected slots; slots that could not be refilled are dropped
+            slots = [question if kept else None for question, kept in zip(generated, keep)]
+            for position, replacement in zip(rejected, replacements):
+                slots[position] = replacement
+            generated = [question for question in slots if question is not None]
+            replaced = True
+    _store(subject_name, syllabus, question_type, generated)
+    if not reused and not replaced:
+        return text
+    return format_questions(reused + generated)
+
+
+# Function to stream one section; bank questions arrive first and streamed questions are numbered after them.
+# Near-duplicates are held back as they stream in and replacements follow at the end.
+def stream_section(question_type, subject_name, syllabus, count, bl_level, sharded=False, use_cache=True, use_bank=False, dedupe=DEDUPE_PAPER):
+    section = SECTION_KEYS[question_type]
+    reused = question_bank.take(subject_name, syllabus, question_type, bl_level, count) if use_bank else []
+    shortfall = count - len(reused)
+    chunks = _stream_text(question_type, subject_name, syllabus, shortfall, bl_level, sharded, use_cache)
+    duplicate_filter = _duplicate_filter(subject_name, reused, dedupe)
+    generated = []
+    if not reused and duplicate_filter is None:
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        generated = parse_questions("".join(parts), section)
+    else:
+        if reused:
+            yield format_questions(reused)
+        rejected = 0
+        for question in iter_questions(chunks, section):
+            # Extra questions past the shortfall are still read so the completion gets cached
+            if len(generated) + rejected >= shortfall:
+                continue
+            if duplicate_filter is not None and not duplicate_filter.accept([question])[0]:
+                rejected += 1
+                continue
+            generated.append(question)
+            yield ("\n\n" if reused or len(generated) > 1 else "") + question.to_text(len(reused) + len(generated))
+        if rejected:
+            exclusions = [question.stem for question in reused + generated]
+            for question in _generate_replacements(question_type, subject_name, syllabus, rejected, bl_level, duplicate_filter, exclusions):
+                generated.append(question)
+                yield ("\n\n" if reused or len(generated) > 1 else "") + question.to_text(len(reused) + len(generated))
+    _store(subject_name, syllabus, question_type, generated)
+
+
+# Function to give each question's level code: the classifier's when it finds a level verb or starter,
+# otherwise the model's own [BLn] tag (plain MCQ stems often have neither signal the classifier looks for)
+def classify_levels(questions):
+    return [
+        LEVEL_CODES[level] if confidence > 0 else question.bloom
+        for question, (level, confidence) in zip(questions, classify_questions([question.stem for question in questions]))
+    ]
+
+
+def _request_band(question_type, subject_name, syllabus, count, label, sharded, use_cache, exclusions):
+    if exclusions is None:
+        return _generate_text(question_type, subject_name, syllabus, count, label, sharded, use_cache)
+    return generate_questions(question_type, subject_name, fit_syllabus(syllabus), count, label, use_cache=False, exclusions=exclusions)
+
+
+# Function to generate one section to a fixed Bloom's blueprint (a list of blueprint.Band). Each band's slots are
+# requested in parallel at that level; every question is checked with the classifier and only the slots left
+# open by misclassified, duplicate or missing questions are requested again, for up to MAX_BLUEPRINT_REPAIR_ROUNDS.
+# Slots still open after that keep a wrong-level question asked for that band, and the result is not compliant.
+def run_blueprint_section(question_type, subject_name, syllabus, count, bands, sharded=False, use_cache=True, use_bank=False, dedupe=DEDUPE_PAPER):
+    section = SECTION_KEYS[question_type]
+    planned = plan_slots(bands, count)
+    slots = {label: [] for label in planned}
+    result = BlueprintResult(planned=planned)
+    duplicate_filter = _duplicate_filter(subject_name, [], dedupe)
+
+    def open_slots():
+        return {label: planned[label] - len(slots[label]) for label in planned if len(slots[label]) < planned[label]}
+
+    # Questions that fit no open band at their level, kept to pad the section if the repair rounds run out
+    rejected = []
+
+    # Questions asked for one band that classify into another band with room are kept there rather than thrown away
+    def place(candidates):
+        codes = classify_levels([question for _, question in candidates])
+        leftovers = []
+        for cross_fill in (False, True):
+            remaining = open_slots()
+            for (requested, question), code in (leftovers if cross_fill else zip(candidates, codes)):
+                label = band_for(code, requested, bands, remaining, cross_fill)
+                if label is None:
+                    if not cross_fill:
+                        leftovers.append(((requested, question), code))
+                    elif requested is not None:
+                        rejected.append((requested, question))
+                    continue
+                if duplicate_filter is not None and not duplicate_filter.accept([question])[0]:
+                    continue
+                question.bloom = code
+                slots[label].append(question)
+                remaining[label] -= 1
+
+    reused = []
+    if use_bank:
+        for band in bands:
+            for level in band.levels:
+                missing = planned[band.label] - len([question for question in reused if question.bloom in band.levels])
+                reused += question_bank.take(subject_name, syllabus, question_type, level, missing)
+        place([(None, question) for question in reused])
+    reused_ids = {id(question) for question in reused}
+
+    for round_number in range(MAX_BLUEPRINT_REPAIR_ROUNDS + 1):
+        missing = open_slots()
+        if not missing:
+            break
+        # The first round may be served from the cache; repairs always ask again, since the cached answer would bring back the same questions
+        exclusions = [question.stem for questions in slots.values() for question in questions] if round_number else None
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = {
+                label: submit(executor, _request_band, question_type, subject_name, syllabus, missing_count, label, sharded, use_cache, exclusions)
+                for label, missing_count in missing.items()
+            }
+            texts = {label: future.result() for label, future in futures.items()}
+        result.requests += len(missing)
+        result.rounds = round_number + 1
+        place([(label, question) for label, text in texts.items() for question in parse_questions(text, section)])
+
+    # Best effort: a slot left open still gets a question that was asked for its band, rather than disappearing
+    result.filled = {label: len(questions) for label, questions in slots.items()}
+    for label, missing_count in open_slots().items():
+        fillers = [question for requested, question in rejected if requested == label]
+        if duplicate_filter is not None:
+            fillers = [question for question, keep in zip(fillers, duplicate_filter.accept(fillers)) if keep]
+        slots[label] += fillers[:missing_count]
+        result.best_effort[label] = len(fillers[:missing_count])
+
+    ordered = [question for band in bands for question in slots[band.label]]
+    _store(subject_name, syllabus, question_type, [question for question in ordered if id(question) not in reused_ids])
+    result.text = format_questions(ordered)
+    return result
+
+
+# Function to generate all sections to a blueprint concurrently; yields (section, BlueprintResult) as each one finishes
+def generate_all_blueprint(subject_name, syllabus, num_mcq, num_short, num_long, bands, sharded=False, use_cache=True, use_bank=False, dedupe=DEDUPE_PAPER):
+    counts = {"mcq": num_mcq, "short": num_short, "long": num_long}
+    with ThreadPoolExecutor(max_workers=len(counts)) as executor:
+        futures = {}
+        for question_type, count in counts.items():
+            if count > 0:
+                futures[submit(executor, run_blueprint_section, question_type, subject_name, syllabus, count, bands, sharded, use_cache, use_bank, dedupe)] = SECTION_KEYS[question_type]
+            else:
+                yield SECTION_KEYS[question_type], BlueprintResult()
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+# Function to generate all sections concurrently; yields (section, questions) as each one finishes
+def generate_all_questions(subject_name, syllabus, num_mcq, num_short, num_long, bl_level, sharded=False, use_cache=True, use_bank=False, dedupe=DEDUPE_PAPER):
+    counts = {"mcq": num_mcq, "short": num_short, "long": num_long}
+    # One worker per section; the shared llm client is safe to call from several threads
+    with ThreadPoolExecutor(max_workers=len(counts)) as executor:
+        futures = {}
+        for question_type, count in counts.items():
+            if count > 0:
+                futures[submit(executor, run_section, question_type, subject_name, syllabus, count, bl_level, sharded, use_cache, use_bank, dedupe)] = SECTION_KEYS[question_type]
+            else:
+                yield SECTION_KEYS[question_type], ""
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+# Function to stream all sections concurrently; yields (section, chunk) and then (section, None) once a section is done
+def stream_all_questions(subject_name, syllabus, num_mcq, num_short, num_long, bl_level, sharded=False, use_cache=True, use_bank=False, dedupe=DEDUPE_PAPER):
+    counts = {"mcq": num_mcq, "short": num_short, "long": num_long}
+    # Workers only push chunks onto the queue, so the caller can update its UI from a single thread
+    events = queue.Queue()
+
+    def worker(question_type, count):
+        section = SECTION_KEYS[question_type]
+        try:
+            for chunk in stream_section(question_type, subject_name, syllabus, count, bl_level, sharded, use_cache, use_bank, dedupe):
+                events.put((section, chunk))
+            events.put((section, None))
+        except Exception as exc:
+            events.put((section, exc))
+
+    with ThreadPoolExecutor(max_workers=len(counts)) as executor:
+        pending = 0
+        for question_type, count in counts.items():
+            if count > 0:
+                submit(executor, worker, question_type, count)
+                pending += 1
+            else:
+                yield SECTION_KEYS[question_type], None
+        while pending:
+            section, chunk = events.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk is None:
+                pending -= 1
+            yield section, chunk
+
+
+# Function to run a background paper job (see jobs.JobQueue). Sections are streamed so progress and the partial
+# text can be reported as each question completes. Returns {"sections": {section: text}} for the requested
+# sections, plus {"blueprint": {section: report}} in blueprint mode.
+def run_paper_job(params, report):
+    counts = {question_type: params[f"num_{question_type}"] for question_type in SECTION_KEYS}
+    total = sum(counts.values()) or 1
+    options = (params["sharded"], params["use_cache"], params["use_bank"], params["dedupe"])
+    requested = [SECTION_KEYS[question_type] for question_type, count in counts.items() if count > 0]
+    if params.get("blueprint"):
+        bands = parse_blueprint(params["blueprint"])
+        sections, reports, done = {}, {}, 0
+        for section, result in generate_all_blueprint(params["subject_name"], params["syllabus"], counts["mcq"], counts["short"], counts["long"], bands, *options):
+            if section not in requested:
+                continue
+            sections[section] = result.text
+            reports[section] = {
+                "planned": result.planned, "filled": result.filled, "best_effort": result.best_effort,
+                "requests": result.requests, "rounds": result.rounds,
+            }
+            done += sum(result.filled.values()) + sum(result.best_effort.values())
+            report(done / total, f"{len(sections)} of {len(requested)} sections done", {"sections": sections})
+        return {"sections": sections, "blueprint": reports}
+    parts = {section: [] for section in requested}
+    parsers = {section: QuestionStreamParser(section) for section in requested}
+    done = 0
+    for section, chunk in stream_all_questions(params["subject_name"], params["syllabus"], counts["mcq"], counts["short"], counts["long"], params["bl_level"], *options):
+        if chunk is None or section not in parts:
+            continue
+        parts[section].append(chunk)
+        completed = len(parsers[section].feed(chunk))
+        if completed:
+            done += completed
+            report(done / total, f"{done} of {total} questions", {"sections": {name: "".join(text) for name, text in parts.items()}})
+    return {"sections": {section: "".join(text) for section, text in parts.items()}}
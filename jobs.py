@@ -0,0 +1,265 @@
+import contextvars
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+
+from generation_service import MAX_CONCURRENT_CALLS, set_call_check, set_user
+
+# Job table shared by every session and process on the host; override with QPG_JOBS_PATH
+JOBS_PATH = os.getenv(
+    "QPG_JOBS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.sqlite3"),
+)
+# Jobs run at once in this process. Jobs mostly wait on their LLM calls, and the generation service already shares
+# those fairly between owners, so as many jobs can run as calls can
+JOB_WORKERS = int(os.getenv("QPG_JOB_WORKERS", MAX_CONCURRENT_CALLS))
+# Progress and partial results are written at most this often while a job runs
+PROGRESS_INTERVAL = 1.0
+# Finished jobs older than this are deleted
+MAX_JOB_AGE = 30 * 24 * 60 * 60
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+# Raised inside a job when it has been cancelled, to stop it before its next LLM call or progress update
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class Job:
+    id: str
+    owner: str
+    kind: str
+    params: dict
+    status: str
+    progress: float
+    message: str
+    result: dict | None
+    error: str | None
+    created_at: float
+    updated_at: float
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Persisted background jobs run on a local worker pool. Status, progress and (partial) results live in SQLite,
+# so a page can attach to a job by id after any rerun or reconnect, and jobs cut off by a restart run again.
+# A free worker takes the oldest queued job of the owner with the fewest jobs running, and among those the owner
+# whose last job started longest ago, so owners take turns and one owner's pile of jobs can't keep the others waiting.
+class JobQueue:
+    def __init__(self, path=JOBS_PATH, workers=JOB_WORKERS):
+        self.path = path
+        self._handlers = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker_pid INTEGER,
+                    started_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, created_at);
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+                """
+            )
+            # Tables made before cancel requests and start times were stored
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in (("cancel_requested", "INTEGER NOT NULL DEFAULT 0"), ("started_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+                FINISHED + (time.time() - MAX_JOB_AGE,),
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # Function to register the function that runs jobs of one kind: handler(params, report) returns a JSON-able
+    # result and may call report(progress, message, partial_result) as it goes
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def submit(self, kind, params, owner):
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for '{kind}' jobs.")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, owner, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, owner, kind, json.dumps(params), QUEUED, now, now),
+            )
+        self._start()
+        return job_id
+
+    # Function to queue again the jobs a stopped process left queued or running; call once at start-up.
+    # Jobs that were asked to cancel while no process was running them are cancelled instead.
+    def recover(self):
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                "SELECT id, status, worker_pid, cancel_requested FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            orphans = [row for row in rows if row[1] == QUEUED or not (row[2] and _pid_alive(row[2]))]
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, message = ?, worker_pid = NULL, updated_at = ? WHERE id = ?",
+                [(CANCELLED if cancel else QUEUED, "Cancelled" if cancel else "", now, job_id) for job_id, _, _, cancel in orphans],
+            )
+        requeued = sum(1 for row in orphans if not row[3])
+        for _ in range(requeued):
+            self._start()
+        return requeued
+
+    # Each run gets a fresh context, so the owner and cancel check of one job never carry over to the next
+    def _start(self):
+        self._executor.submit(contextvars.Context().run, self._run_next)
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, owner, kind, params, status, progress, message, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return _job(row) if row else None
+
+    def list(self, owner, limit=10):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """
+                SELECT id, owner, kind, params, status, progress, message, result, error, created_at, updated_at
+                FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?
+                """,
+                (owner, limit),
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    # Function to cancel a job. A queued job is cancelled at once; a running one, in whichever process runs it,
+    # stops before its next LLM call or progress update.
+    def cancel(self, job_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                (time.time(), job_id, QUEUED, RUNNING),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, "Cancelled", time.time(), job_id, QUEUED),
+            )
+
+    def _cancel_requested(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+    # Function to claim the next queued job, fairly between owners; None when nothing is queued
+    def _claim_next(self):
+        while True:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    """
+                    SELECT id FROM jobs AS queued WHERE status = ?
+                    ORDER BY
+                        (SELECT COUNT(*) FROM jobs AS other WHERE other.owner = queued.owner AND other.status = ?),
+                        (SELECT COALESCE(MAX(started_at), 0) FROM jobs AS other WHERE other.owner = queued.owner),
+                        created_at
+                    LIMIT 1
+                    """,
+                    (QUEUED, RUNNING),
+                ).fetchone()
+                if row is None:
+                    return None
+                # Only one worker, in any process, gets to run a queued job; if another got there first, look again
+                now = time.time()
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = ?, worker_pid = ?, started_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (RUNNING, os.getpid(), now, now, row[0], QUEUED),
+                ).rowcount
+            if claimed:
+                return self.get(row[0])
+
+    # One run per queued job is submitted, but each run takes whichever job is fairest to start now
+    def _run_next(self):
+        job = self._claim_next()
+        if job is None:
+            # Cancelled before it started, or already taken by another worker or process
+            return
+        job_id = job.id
+        # Calls made for the job queue under the owner's name in the shared generation service
+        set_user(job.owner)
+
+        def check():
+            if self._cancel_requested(job_id):
+                raise JobCancelled()
+
+        # Checked before every LLM call the job makes, including those on its section and batch threads
+        set_call_check(check)
+        last_write = 0.0
+
+        def report(progress, message="", partial=None):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write < PROGRESS_INTERVAL and progress < 1:
+                return
+            last_write = now
+            check()
+            fields = {"progress": min(progress, 1.0), "message": message}
+            if partial is not None:
+                fields["result"] = json.dumps(partial)
+            self._update(job_id, **fields)
+
+        try:
+            result = self._handlers[job.kind](job.params, report)
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED, message="Cancelled")
+        except Exception as exc:
+            self._update(job_id, status=FAILED, error=f"{type(exc).__name__}: {exc}")
+        else:
+            self._update(job_id, status=DONE, progress=1.0, message="Done", result=json.dumps(result))
+
+
+def _job(row):
+    job_id, owner, kind, params, status, progress, message, result, error, created_at, updated_at = row
+    return Job(
+        job_id, owner, kind, json.loads(params), status, progress, message,
+        json.loads(result) if result else None, error, created_at, updated_at,
+    )
@@ -0,0 +1,155 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import telemetry
+from rate_limiter import is_retryable, retry_after
+
+# Requests for at most this many questions of these types go to the fast model first
+FAST_MAX_QUESTIONS = 5
+FAST_QUESTION_TYPES = ("short", "long")
+# A model averaging more than this per call is tried after the others while they are healthy
+LATENCY_BUDGET_SECONDS = 20.0
+# Likewise for a model failing more often than this lately
+MAX_ERROR_RATE = 0.5
+# How long a model is passed over after a 429 or timeout, unless the server asks for longer
+COOLDOWN_SECONDS = 30.0
+# Weight of each new call in the running averages
+STATS_RATE = 0.2
+
+
+# Running latency and error figures for one model
+@dataclass(slots=True)
+class ModelStats:
+    calls: int = 0
+    failures: int = 0
+    latency: float | None = None
+    error_rate: float = 0.0
+    cooldown_until: float = 0.0
+
+
+# Picks the model for each request from its question type and size and each model's recent latency and errors,
+# and fails over to the next model when a call hits a 429, a 5xx or a timeout. `clients` maps model name -> chat model.
+class ModelRouter:
+    def __init__(self, clients, primary, fast=None):
+        self.clients = clients
+        self.primary = primary
+        self.fast = fast if fast in clients and fast != primary else None
+        self.stats = {model: ModelStats() for model in clients}
+        self._lock = threading.Lock()
+
+    def client(self, model=None):
+        return self.clients[model or self.primary]
+
+    # Function to give the models in order of preference for a request, before taking their health into account
+    def preferred(self, question_type, count):
+        models = [self.primary] + [model for model in self.clients if model != self.primary]
+        if self.fast and question_type in FAST_QUESTION_TYPES and count <= FAST_MAX_QUESTIONS:
+            models.remove(self.fast)
+            models.insert(0, self.fast)
+        return models
+
+    def _healthy(self, model, now):
+        stats = self.stats[model]
+        return (
+            now >= stats.cooldown_until
+            and stats.error_rate <= MAX_ERROR_RATE
+            and (stats.latency is None or stats.latency <= LATENCY_BUDGET_SECONDS)
+        )
+
+    # Function to give the order models are tried in: healthy ones by preference, then the rest as a last resort
+    def candidates(self, question_type, count):
+        now = time.monotonic()
+        with self._lock:
+            models = self.preferred(question_type, count)
+            healthy = [model for model in models if self._healthy(model, now)]
+        return healthy + [model for model in models if model not in healthy]
+
+    def record(self, model, seconds, exc=None):
+        with self._lock:
+            stats = self.stats[model]
+            stats.calls += 1
+            stats.error_rate += STATS_RATE * ((exc is not None) - stats.error_rate)
+            if exc is None:
+                stats.latency = seconds if stats.latency is None else stats.latency + STATS_RATE * (seconds - stats.latency)
+            else:
+                stats.failures += 1
+                if is_retryable(exc):
+                    stats.cooldown_until = time.monotonic() + max(COOLDOWN_SECONDS, retry_after(exc))
+        telemetry.increment("qpg_router_calls_total", model=model, outcome="ok" if exc is None else type(exc).__name__)
+
+    def _failover(self, model, exc, candidates):
+        # Errors that another model won't fix, or nowhere left to go, are the caller's to handle
+        if not is_retryable(exc) or model == candidates[-1]:
+            return False
+        telemetry.log_event("llm_failover", model=model, error=f"{type(exc).__name__}: {exc}", next_model=candidates[candidates.index(model) + 1])
+        return True
+
+    # Function to run call(model) on the best model, failing over on retryable errors; returns (result, model)
+    def invoke(self, question_type, count, call):
+        candidates = self.candidates(question_type, count)
+        for model in candidates:
+            started = time.perf_counter()
+            try:
+                result = call(model)
+            except Exception as exc:
+                self.record(model, time.perf_counter() - started, exc)
+                if self._failover(model, exc, candidates):
+                    continue
+                raise
+            self.record(model, time.perf_counter() - started)
+            return result, model
+
+    # Function to stream call(model) from the best model. A model that fails before its first chunk is
+    # failed over; once chunks have been passed on, errors are raised. The model used is on the result's `.model`.
+    def stream(self, question_type, count, call):
+        return RoutedStream(self, question_type, count, call)
+
+    # Function to copy the stats for display, one row per model
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "model": model,
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "mean_seconds": None if stats.latency is None else round(stats.latency, 3),
+                    "error_rate": round(stats.error_rate, 3),
+                    "cooling_down_seconds": round(max(stats.cooldown_until - now, 0.0), 1),
+                }
+                for model, stats in self.stats.items()
+            ]
+
+
+# Models are picked when reading starts, so a stream that waited in a queue goes by up-to-date stats
+class RoutedStream:
+    def __init__(self, router, question_type, count, call):
+        self.router = router
+        self.question_type = question_type
+        self.count = count
+        self.call = call
+        self.model = None
+
+    def __iter__(self):
+        candidates = self.router.candidates(self.question_type, self.count)
+        for model in candidates:
+            started = time.perf_counter()
+            try:
+                chunks = iter(self.call(model))
+                first = next(chunks, None)
+            except Exception as exc:
+                self.router.record(model, time.perf_counter() - started, exc)
+                if self.router._failover(model, exc, candidates):
+                    continue
+                raise
+            self.model = model
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            except Exception as exc:
+                self.router.record(model, time.perf_counter() - started, exc)
+                raise
+            self.router.record(model, time.perf_counter() - started)
+            return
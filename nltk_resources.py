@@ -0,0 +1,129 @@
+# Offline NLTK data for the analyzer: the tokenizer and stopword data are read from a local
+# directory and never downloaded at runtime. Fetch them once, on a machine with network access:
+#
+#     python nltk_resources.py download
+#
+# and ship the resulting nltk_data/ directory with the app (or point QPG_NLTK_DATA at a copy).
+#
+#     python nltk_resources.py cold-start
+#
+# measures how long a fresh process takes to load the analyzer and classify its first question.
+import os
+import subprocess
+import sys
+import time
+from functools import lru_cache
+
+# Local NLTK data directory, searched before NLTK's own locations
+NLTK_DATA_DIR = os.getenv(
+    "QPG_NLTK_DATA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"),
+)
+# Resource name -> path nltk.data.find() looks it up by
+RESOURCES = {
+    "punkt_tab": "tokenizers/punkt_tab/english",
+    "stopwords": "corpora/stopwords",
+}
+# Budget for a fresh process to import the analyzer and classify one question
+COLD_START_TARGET_SECONDS = 1.0
+
+# NLTK's English stopword list, used when the corpus has not been fetched
+FALLBACK_STOPWORDS = frozenset(
+    """
+    i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves
+    he him his himself she she's her hers herself it it's its itself they them their theirs themselves
+    what which who whom this that that'll these those am is are was were be been being have has had
+    having do does did doing a an the and but if or because as until while of at by for with about
+    against between into through during before after above below to from up down in out on off over
+    under again further then once here there when where why how all any both each few more most other
+    some such no nor not only own same so than too very s t can will just don don't should should've
+    now d ll m o re ve y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn
+    hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn
+    shouldn't wasn wasn't weren weren't won won't wouldn wouldn't
+    """.split()
+)
+
+
+@lru_cache(maxsize=None)
+def _nltk():
+    import nltk  # type: ignore
+
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    return nltk
+
+
+# Function to check whether a resource is available locally, without touching the network
+@lru_cache(maxsize=None)
+def has_resource(name):
+    try:
+        _nltk().data.find(RESOURCES[name])
+        return True
+    except LookupError:
+        return False
+
+
+# Function to get the word tokenizer; without the punkt data it tokenizes each text as a single sentence
+@lru_cache(maxsize=None)
+def word_tokenizer():
+    from nltk.tokenize import word_tokenize  # type: ignore
+
+    if has_resource("punkt_tab"):
+        return word_tokenize
+    return lambda text: word_tokenize(text, preserve_line=True)
+
+
+@lru_cache(maxsize=None)
+def stop_words():
+    if has_resource("stopwords"):
+        from nltk.corpus import stopwords  # type: ignore
+
+        return frozenset(stopwords.words("english"))
+    return FALLBACK_STOPWORDS
+
+
+# Function to fetch the resources into NLTK_DATA_DIR; the only place this module uses the network
+def download(directory=NLTK_DATA_DIR):
+    os.makedirs(directory, exist_ok=True)
+    for name in RESOURCES:
+        if not _nltk().download(name, download_dir=directory, quiet=True):
+            raise RuntimeError(f"Could not download NLTK resource {name!r}")
+    has_resource.cache_clear()
+    word_tokenizer.cache_clear()
+    stop_words.cache_clear()
+
+
+# Function to time a fresh interpreter importing the analyzer's modules and classifying one question
+def measure_cold_start():
+    script = (
+        "import time; started = time.perf_counter()\n"
+        "from bloom_classifier import analyze_question\n"
+        "import bulk_analysis\n"
+        "analyze_question('How would you explain the water cycle?')\n"
+        "print(time.perf_counter() - started)\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", script], cwd=here, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    command = (argv or sys.argv[1:] or ["status"])[0]
+    if command == "download":
+        download()
+        print(f"NLTK data saved to {NLTK_DATA_DIR}")
+    elif command == "cold-start":
+        seconds = measure_cold_start()
+        verdict = "within" if seconds <= COLD_START_TARGET_SECONDS else "OVER"
+        print(f"Analyzer cold start: {seconds:.3f}s ({verdict} the {COLD_START_TARGET_SECONDS:.1f}s target)")
+        return 0 if seconds <= COLD_START_TARGET_SECONDS else 1
+    else:
+        started = time.perf_counter()
+        for name in RESOURCES:
+            print(f"{name}: {'found' if has_resource(name) else 'missing (using fallback)'}")
+        print(f"Checked in {time.perf_counter() - started:.3f}s; data directory {NLTK_DATA_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
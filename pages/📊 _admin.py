@@ -0,0 +1,75 @@
+import os
+
+import streamlit as st # type: ignore
+
+import telemetry
+from generation_service import generation_service
+from generators import get_router
+
+# Admin panel: where generation time goes in this server process
+
+def main():
+    st.set_page_config(page_title="Admin: Telemetry", layout="wide")
+    import pandas as pd # type: ignore
+
+    st.title("📊 Generation Telemetry")
+    st.markdown("Metrics for this server process since it started. Every event is also appended to the JSON log.")
+
+    counters, histograms, events = telemetry.snapshot()
+
+    st.header("Timings")
+    if histograms:
+        rows = [{"Metric": row["metric"], **row["labels"], "Count": row["count"], "Mean (s)": round(row["mean_seconds"], 4), "p95 ≤ (s)": row["p95_seconds_at_most"]} for row in histograms]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+    else:
+        st.info("Nothing recorded yet. Generate some questions and come back.")
+
+    st.header("Generation Service")
+    scheduler = generation_service.scheduler
+    waiting = scheduler.waiting()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("LLM calls running", f"{scheduler.active} / {scheduler.limit}")
+    col2.metric("Distinct requests in flight", generation_service.in_flight())
+    col3.metric("Calls queued", sum(waiting.values()))
+    if waiting:
+        st.dataframe(pd.DataFrame({"Session": list(waiting), "Queued calls": list(waiting.values())}), use_container_width=True)
+
+    st.header("Model Routing")
+    try:
+        router = get_router()
+    except ValueError as exc:
+        st.info(str(exc))
+    else:
+        st.markdown(f"Primary model: `{router.primary}`" + (f", fast model: `{router.fast}`" if router.fast else ""))
+        rows = [
+            {"Model": row["model"], "Calls": row["calls"], "Failures": row["failures"], "Mean (s)": row["mean_seconds"],
+             "Recent error rate": row["error_rate"], "Cooling down (s)": row["cooling_down_seconds"]}
+            for row in router.snapshot()
+        ]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+    st.header("Counters")
+    if counters:
+        rows = [{"Metric": row["metric"], **row["labels"], "Value": row["value"]} for row in counters]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+    st.header("Recent Events")
+    event_filter = st.multiselect("Event types", sorted({event["event"] for event in events}))
+    shown = [event for event in reversed(events) if not event_filter or event["event"] in event_filter]
+    if shown:
+        st.dataframe(pd.DataFrame(shown[:200]), use_container_width=True)
+
+    st.header("Export")
+    st.markdown(f"JSON log: `{telemetry.LOG_PATH}`")
+    if st.button("Write Prometheus file now"):
+        st.success(f"Written to `{telemetry.write_metrics(force=True)}`")
+    st.download_button("Download Prometheus metrics", telemetry.prometheus_text(), file_name="metrics.prom", mime="text/plain")
+
+    st.header("Profiles")
+    st.markdown("Start the server with `QPG_PROFILE=1`, or open any page with `?profile=1` in the URL, to save a profile of each rerun.")
+    for path in telemetry.saved_profiles()[:10]:
+        with open(path, encoding="utf-8") as profile:
+            st.download_button(os.path.basename(path), profile.read(), file_name=os.path.basename(path), mime="text/plain", key=path)
+
+if __name__ == "__main__":
+    main()
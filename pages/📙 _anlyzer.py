@@ -1,154 +1,117 @@
 import streamlit as st # type: ignore
-import pandas as pd # type: ignore
-import nltk # type: ignore
 import random
-import matplotlib.pyplot as plt # type: ignore
-from nltk.tokenize import word_tokenize # type: ignore
-from nltk.corpus import stopwords # type: ignore
-import re
-import base64
 
-import nltk
+from bloom_classifier import blooms_taxonomy, classify_questions
+from bulk_analysis import RESULT_FIELDS, BulkSummary, analyze_stream, iter_uploaded_questions
+from question_templates import EXPORT_FORMATS, MAX_BULK_QUESTIONS, TEMPLATE_FIELDS, TemplatePool, available_formats, export_bytes, render_question
+import telemetry
 
-# type: ignore
-
-nltk.download('punkt_tab')
+# pandas and matplotlib are imported inside the functions that use them, so the page opens before they load
 
+# Function to generate a question based on a topic and Bloom's level
+def generate_question(topic, level):
+    if level not in blooms_taxonomy:
+        return "Invalid Bloom's Taxonomy level selected."
+    
+    starter = random.choice(blooms_taxonomy[level]["question_starters"])
+    return render_question(topic, starter)
 
+# Function to offer a table as a CSV download; the click doesn't rerun the page, so the table stays on screen
+def download_csv(df, key):
+    st.download_button("Download CSV File", df.to_csv(index=False), file_name="bloom_questions.csv", mime="text/csv", key=key, on_click="ignore")
 
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
+# Function to draw a seeded sample of unique templated questions; cached, so reruns and downloads don't redo it
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_question_pool(topics, levels, count, seed):
+    return TemplatePool(topics, levels).sample(count, seed)
 
-# Define Bloom's Taxonomy levels and their characteristics
-blooms_taxonomy = {
-    "Remember": {
-        "description": "Recall facts and basic concepts",
-        "verbs": ["define", "duplicate", "list", "memorize", "recall", "repeat", "reproduce", "state", "identify", "name", "recognize"],
-        "question_starters": ["What is...", "Who was...", "When did...", "How would you describe...", "Can you recall...", "How would you define...", "How would you identify..."],
-        "example": "What are the six levels of Bloom's Taxonomy?",
-       "image_url": r"images/remember-at-10.17.08-copy-1-1024x575.jpg"
-    },
-    "Understand": {
-        "description": "Explain ideas or concepts",
-        "verbs": ["classify", "describe", "discuss", "explain", "identify", "locate", "recognize", "report", "select", "translate", "paraphrase", "interpret", "summarize"],
-        "question_starters": ["How would you classify...", "How would you compare...", "What is the main idea of...", "Can you explain what is happening...", "How would you summarize...", "How would you rephrase..."],
-        "example": "Explain the difference between the Remember and Understand levels in Bloom's Taxonomy.",
-        "image_url": r"images/understand-at-10.17.30-copy-1-1024x575.jpg"
-    },
-    "Apply": {
-        "description": "Use information in new situations",
-        "verbs": ["execute", "implement", "solve", "use", "demonstrate", "interpret", "operate", "schedule", "sketch", "apply", "employ", "illustrate", "practice"],
-        "question_starters": ["How would you use...", "What examples can you find to...", "How would you solve __ using what you've learned...", "How would you organize __ to show...", "How would you apply what you learned to develop..."],
-        "example": "Using Bloom's Taxonomy, create a set of questions for teaching photosynthesis.",
-        "image_url": r"images/apply-at-10.17.53-copy-1-1024x575.jpg"
-    },
-    "Analyze": {
-        "description": "Draw connections among ideas",
-        "verbs": ["differentiate", "organize", "relate", "compare", "contrast", "distinguish", "examine", "experiment", "question", "test", "analyze", "categorize", "criticize", "diagram"],
-        "question_starters": ["What are the parts or features of...", "How is __ related to...", "Why do you think...", "What is the theme...", "What motive is there...", "What conclusions can you draw..."],
-        "example": "Analyze how different question types affect student engagement in online learning.",
-        "image_url": r"images/analyze-at-10.18.16-copy-1-1024x575.jpg"
-          
-    },
-    "Evaluate": {
-        "description": "Justify a stand or decision",
-        "verbs": ["appraise", "argue", "defend", "judge", "select", "support", "value", "evaluate", "critique", "weigh", "assess", "choose", "compare", "conclude", "measure"],
-        "question_starters": ["Do you agree with the actions...", "What is your opinion of...", "How would you prove/disprove...", "How would you evaluate...", "What choice would you have made...", "What data was used to make the conclusion..."],
-        "example": "Evaluate the effectiveness of using Bloom's Taxonomy in curriculum design.",
-        "image_url": r"images/evaluate-at-10.18.56-copy-1-1024x575.jpg"
-    },
-    "Create": {
-        "description": "Produce new or original work",
-        "verbs": ["design", "assemble", "construct", "conjecture", "develop", "formulate", "author", "investigate", "create", "compose", "generate", "plan", "produce", "devise", "invent"],
-        "question_starters": ["What would happen if...", "Can you design a __ to...", "Can you see a possible solution to...", "How would you devise your own way to...", "What would you create to change...", "How would you test..."],
-        "example": "Design a new educational framework that builds upon Bloom's Taxonomy for the digital age.",
-        "image_url": r"images/create-at-10.19.27-copy-1-1024x575.jpg"
-    }
-}
+# Function to show the bulk question pool with a download in the chosen format, written only when clicked
+def show_question_pool(rows, possible):
+    st.caption(f"{len(rows):,} unique questions drawn from {possible:,} possible topic, level, starter and verb combinations.")
+    import pandas as pd # type: ignore
+    st.dataframe(pd.DataFrame(rows[:100], columns=TEMPLATE_FIELDS), use_container_width=True)
+    export_format = st.radio("Download format", available_formats(), horizontal=True, key="pool_format")
+    extension, mime, _ = EXPORT_FORMATS[export_format]
+    st.download_button(
+        f"Download all {len(rows):,} questions ({export_format})",
+        lambda: export_bytes(rows, export_format),
+        file_name=f"bloom_question_pool.{extension}",
+        mime=mime,
+        on_click="ignore",
+    )
+    missing = [name for name in EXPORT_FORMATS if name not in available_formats()]
+    if missing:
+        st.caption("To also download " + ", ".join(f"{name}, install {EXPORT_FORMATS[name][2]}" for name in missing) + ".")
 
-# Function to analyze a question and determine its Bloom's level
-def analyze_question(question):
-    question = question.lower()
-    tokens = word_tokenize(question)
-    stop_words = set(stopwords.words('english'))
-    filtered_tokens = [w for w in tokens if w.isalpha() and w not in stop_words]
-    
-    # Check for question starters
-    starter_matches = {}
-    for level, data in blooms_taxonomy.items():
-        for starter in data["question_starters"]:
-            starter_lower = starter.lower().replace("...", "")
-            if question.startswith(starter_lower):
-                if level not in starter_matches:
-                    starter_matches[level] = 0
-                starter_matches[level] += 3  # Give more weight to question starters
-    
-    # Check for verbs
-    verb_matches = {}
-    for level, data in blooms_taxonomy.items():
-        for verb in data["verbs"]:
-            if verb in filtered_tokens:
-                if level not in verb_matches:
-                    verb_matches[level] = 0
-                verb_matches[level] += 1
-    
-    # Combine matches
-    all_matches = {}
-    for level in blooms_taxonomy.keys():
-        all_matches[level] = starter_matches.get(level, 0) + verb_matches.get(level, 0)
+# Function to draw the level distribution chart and summary for analyzed questions
+def show_level_summary(level_counts, total):
+    import matplotlib.pyplot as plt # type: ignore
     
-    # If no clear matches, use a more sophisticated approach
-    if sum(all_matches.values()) == 0:
-        # Look for patterns in the question
-        if re.search(r'what is|who is|when|where|list|name|identify', question):
-            all_matches["Remember"] += 1
-        if re.search(r'describe|explain|summarize|interpret|infer', question):
-            all_matches["Understand"] += 1
-        if re.search(r'apply|use|demonstrate|illustrate|show', question):
-            all_matches["Apply"] += 1
-        if re.search(r'analyze|compare|contrast|examine|investigate', question):
-            all_matches["Analyze"] += 1
-        if re.search(r'evaluate|assess|justify|critique|recommend', question):
-            all_matches["Evaluate"] += 1
-        if re.search(r'create|design|develop|compose|construct|formulate', question):
-            all_matches["Create"] += 1
+    col1, col2 = st.columns([3, 2])
     
-    # Determine the most likely level
-    if sum(all_matches.values()) == 0:
-        return "Remember", 0  # Default to lowest level if no matches
-    
-    max_level = max(all_matches, key=all_matches.get)
-    confidence = all_matches[max_level] / sum(all_matches.values()) * 100
+    with col1:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        bars = ax.bar(list(level_counts.keys()), list(level_counts.values()), color=['#8dd3c7', '#ffffb3', '#bebada', '#fb8072', '#80b1d3', '#fdb462'])
+        ax.set_xlabel('Bloom\'s Taxonomy Level')
+        ax.set_ylabel('Number of Questions')
+        ax.set_title('Distribution of Questions by Bloom\'s Taxonomy Level')
+        
+        # Add count labels on top of bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + 0.1, f'{height:.0f}', 
+                    ha='center', va='bottom')
+        
+        plt.tight_layout()
+        st.pyplot(fig)
+        plt.close(fig)
     
-    return max_level, confidence
+    with col2:
+        st.markdown("### Summary")
+        st.markdown(f"Total questions analyzed: **{total}**")
+        
+        # Calculate percentages
+        for level, count in level_counts.items():
+            percentage = (count / total) * 100
+            st.markdown(f"- **{level}**: {count} questions ({percentage:.1f}%)")
+        
+        st.markdown("### Export Results")
+    return col2
 
-# Function to generate a question based on a topic and Bloom's level
-def generate_question(topic, level):
-    if level not in blooms_taxonomy:
-        return "Invalid Bloom's Taxonomy level selected."
-    
-    starter = random.choice(blooms_taxonomy[level]["question_starters"])
-    verb = random.choice(blooms_taxonomy[level]["verbs"])
+# Function to classify an uploaded file batch by batch, updating a progress bar as it goes
+def analyze_upload(uploaded_file):
+    progress = st.progress(0.0, text="Analyzing questions...")
+    summary = BulkSummary()
+    with telemetry.timed("qpg_analyze_seconds", "analyze", mode="upload") as fields:
+        try:
+            for questions, scores, fraction in analyze_stream(iter_uploaded_questions(uploaded_file)):
+                summary.add(questions, scores)
+                progress.progress(min(fraction, 1.0), text=f"Analyzed {summary.total:,} questions...")
+        finally:
+            summary.close()
+            fields["questions"] = summary.total
+    telemetry.increment("qpg_analyze_questions_total", summary.total, mode="upload")
+    progress.empty()
+    return summary
+
+# Function to show the totals and a paginated preview of a bulk analysis
+def show_bulk_results(summary, page_size=50):
+    if summary.total == 0:
+        st.warning("No valid questions found in the uploaded file.")
+        return
     
-    # Replace placeholder with topic
-    question = starter.replace("...", f" {topic}")
+    with show_level_summary(summary.level_counts(), summary.total):
+        # Read from disk only when clicked, rather than into memory on every rerun
+        st.download_button("Download all results (CSV)", summary.read_results, file_name="bloom_questions.csv", mime="text/csv", on_click="ignore")
     
-    # If the starter doesn't have a placeholder, append the topic
-    if "..." in starter:
-        return question
-    else:
-        return f"{question} {topic}?"
-
-# Function to create a downloadable CSV
-def get_table_download_link(df):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="bloom_questions.csv">Download CSV File</a>'
-    return href
+    st.markdown("### Preview")
+    if summary.total > len(summary.preview):
+        st.caption(f"Showing the first {len(summary.preview):,} of {summary.total:,} questions; download the CSV for the rest.")
+    pages = max(1, -(-len(summary.preview) // page_size))
+    page = st.number_input("Page", min_value=1, max_value=pages, key="bulk_page")
+    rows = summary.preview[(page - 1) * page_size:page * page_size]
+    import pandas as pd # type: ignore
+    st.dataframe(pd.DataFrame(rows, columns=RESULT_FIELDS), use_container_width=True)
 
 # Streamlit UI
 def main():
@@ -207,58 +170,42 @@ def main():
         
         if st.button("Analyze Questions"):
             if text_area:
-                questions = text_area.strip().split('\n')
+                questions = [q for q in text_area.strip().split('\n') if q.strip()]
                 results = []
                 
-                for q in questions:
-                    if q.strip():
-                        level, confidence = analyze_question(q)
-                        results.append({
-                            "Question": q,
-                            "Bloom's Level": level,
-                            "Confidence": f"{confidence:.1f}%"
-                        })
+                for q, (level, confidence) in zip(questions, classify_questions(questions)):
+                    results.append({
+                        "Question": q,
+                        "Bloom's Level": level,
+                        "Confidence": f"{confidence:.1f}%"
+                    })
                 
                 if results:
+                    import pandas as pd # type: ignore
                     results_df = pd.DataFrame(results)
                     st.dataframe(results_df, use_container_width=True)
                     
-                    # Create visualization
-                    level_counts = results_df["Bloom's Level"].value_counts()
-                    
-                    col1, col2 = st.columns([3, 2])
-                    
-                    with col1:
-                        fig, ax = plt.subplots(figsize=(10, 6))
-                        bars = ax.bar(level_counts.index, level_counts.values, color=['#8dd3c7', '#ffffb3', '#bebada', '#fb8072', '#80b1d3', '#fdb462'])
-                        ax.set_xlabel('Bloom\'s Taxonomy Level')
-                        ax.set_ylabel('Number of Questions')
-                        ax.set_title('Distribution of Questions by Bloom\'s Taxonomy Level')
-                        
-                        # Add count labels on top of bars
-                        for bar in bars:
-                            height = bar.get_height()
-                            ax.text(bar.get_x() + bar.get_width()/2., height + 0.1, f'{height:.0f}', 
-                                    ha='center', va='bottom')
-                        
-                        plt.tight_layout()
-                        st.pyplot(fig)
-                    
-                    with col2:
-                        st.markdown("### Summary")
-                        st.markdown(f"Total questions analyzed: **{len(results)}**")
-                        
-                        # Calculate percentages
-                        for level, count in level_counts.items():
-                            percentage = (count / len(results)) * 100
-                            st.markdown(f"- **{level}**: {count} questions ({percentage:.1f}%)")
-                        
-                        st.markdown("### Export Results")
-                        st.markdown(get_table_download_link(results_df), unsafe_allow_html=True)
+                    with show_level_summary(results_df["Bloom's Level"].value_counts().to_dict(), len(results)):
+                        download_csv(results_df, "download_analyzed")
                 else:
                     st.warning("No valid questions found. Please enter at least one question.")
             else:
                 st.warning("Please enter at least one question to analyze.")
+        
+        st.markdown("### Analyze a Question File")
+        uploaded_questions = st.file_uploader("Upload questions (CSV, DOCX or TXT, one question per line or row):", type=["csv", "docx", "txt"])
+        
+        if st.button("Analyze File"):
+            if uploaded_questions is not None:
+                if "bulk_summary" in st.session_state:
+                    st.session_state.bulk_summary.discard()
+                st.session_state.bulk_summary = analyze_upload(uploaded_questions)
+                st.session_state.bulk_page = 1
+            else:
+                st.warning("Please upload a file to analyze.")
+        
+        if "bulk_summary" in st.session_state:
+            show_bulk_results(st.session_state.bulk_summary)
     
     # Question Generator Tab
     with tabs[1]:
@@ -281,22 +228,20 @@ def main():
                 # Show example verbs for this level
                 st.markdown(f"### Sample verbs for {level} level")
                 st.markdown(", ".join(blooms_taxonomy[level]["verbs"][:10]))
-                
-                # Option to generate multiple questions
-                st.markdown("### Generate Multiple Questions")
-                num_questions = st.slider("Number of questions to generate:", 1, 20, 5)
-                
-                if st.button("Generate Multiple Questions"):
-                    questions = []
-                    for _ in range(num_questions):
-                        questions.append({
-                            "Question": generate_question(topic, level),
-                            "Bloom's Level": level
-                        })
-                    
-                    questions_df = pd.DataFrame(questions)
-                    st.dataframe(questions_df, use_container_width=True)
-                    st.markdown(get_table_download_link(questions_df), unsafe_allow_html=True)
+            else:
+                st.warning("Please enter a topic to generate questions.")
+        
+        # Several different questions for the topic and level, drawn from every starter and verb combination
+        st.markdown("### Generate Multiple Questions")
+        possible = len(blooms_taxonomy[level]["question_starters"]) * len(blooms_taxonomy[level]["verbs"])
+        num_questions = st.slider("Number of questions to generate:", 1, possible, 5)
+        
+        if st.button("Generate Multiple Questions"):
+            if topic:
+                import pandas as pd # type: ignore
+                questions_df = pd.DataFrame(TemplatePool([topic], [level]).sample(num_questions), columns=TEMPLATE_FIELDS)
+                st.dataframe(questions_df[["Question", "Bloom's Level"]], use_container_width=True)
+                download_csv(questions_df, "download_multiple")
             else:
                 st.warning("Please enter a topic to generate questions.")
         
@@ -313,11 +258,32 @@ def main():
                         "Description": blooms_taxonomy[bloom_level]["description"]
                     })
                 
+                import pandas as pd # type: ignore
                 all_questions_df = pd.DataFrame(all_questions)
                 st.dataframe(all_questions_df, use_container_width=True)
-                st.markdown(get_table_download_link(all_questions_df), unsafe_allow_html=True)
+                download_csv(all_questions_df, "download_all_levels")
             else:
                 st.warning("Please enter a topic to generate questions.")
+        
+        # Offline question pool: no model calls, so thousands of questions cost nothing
+        st.markdown("### Bulk Question Pool")
+        st.markdown("Build a large pool of unique templated questions, one per topic, level, question starter and verb. The same seed always gives the same questions.")
+        pool_topics = st.text_area("Topics (one per line):", key="pool_topics")
+        pool_levels = st.multiselect("Levels:", list(blooms_taxonomy.keys()), default=list(blooms_taxonomy.keys()), key="pool_levels")
+        col1, col2 = st.columns(2)
+        pool_count = col1.number_input("Number of questions:", min_value=1, max_value=MAX_BULK_QUESTIONS, value=1000, step=500, key="pool_count")
+        pool_seed = col2.number_input("Seed:", min_value=0, value=42, step=1, key="pool_seed")
+        
+        if st.button("Build Question Pool"):
+            topics = tuple(line for line in pool_topics.splitlines() if line.strip())
+            if topics and pool_levels:
+                st.session_state.question_pool = (topics, tuple(pool_levels), int(pool_count), int(pool_seed))
+            else:
+                st.warning("Please enter at least one topic and pick at least one level.")
+        
+        if "question_pool" in st.session_state:
+            topics, levels, count, seed = st.session_state.question_pool
+            show_question_pool(build_question_pool(topics, levels, count, seed), TemplatePool(topics, levels).size)
     
     # Bloom's Taxonomy Guide Tab
     with tabs[2]:
@@ -356,4 +322,10 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Time this run of the page (and profile it when QPG_PROFILE=1 or the URL has ?profile=1). finally also
+    # times reruns cut short by st.rerun() or an error
+    rerun = telemetry.start_rerun("analyzer", profile=st.query_params.get("profile") == "1")
+    try:
+        main()
+    finally:
+        telemetry.finish_rerun(rerun)
\ No newline at end of file
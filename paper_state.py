@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+
+from docx_export import SECTION_HEADINGS
+from question_parser import format_questions, parse_questions
+
+# Changes kept for undo
+MAX_UNDO = 50
+
+
+# One change to a section. Positions index the section as it was before the change; None replaces the whole section.
+# Equal-length before/after is an in-place replacement, an empty `after` a removal.
+@dataclass(frozen=True, slots=True)
+class Delta:
+    section: str
+    positions: tuple | None
+    before: tuple
+    after: tuple
+    text_before: str
+    text_after: str
+
+
+def _splice(questions, positions, old, new):
+    if positions is None:
+        return new
+    result = list(questions)
+    if len(old) == len(new):
+        for position, question in zip(positions, new):
+            result[position] = question
+    elif not new:
+        for position in reversed(positions):
+            del result[position]
+    else:
+        # Undoing a removal puts the questions back where they were
+        for position, question in zip(positions, new):
+            result.insert(position, question)
+    return tuple(result)
+
+
+# A paper as a versioned list of questions per section. Every change is stored as a delta, so undo only touches
+# the questions it changed, and a section's text is only rebuilt when a delta touches that section.
+class PaperState:
+    def __init__(self):
+        self.version = 0
+        self._questions = {section: () for section in SECTION_HEADINGS}
+        self._texts = {section: "" for section in SECTION_HEADINGS}
+        self._undo = []
+
+    def questions(self, section):
+        return self._questions[section]
+
+    def text(self, section):
+        return self._texts[section]
+
+    # Section -> text of the current version, the shape the DOCX export takes
+    def sections(self):
+        return dict(self._texts)
+
+    def total(self):
+        return sum(len(questions) for questions in self._questions.values())
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    def _apply(self, delta, undo=False):
+        if undo:
+            self._questions[delta.section] = _splice(self._questions[delta.section], delta.positions, delta.after, delta.before)
+            self._texts[delta.section] = delta.text_before
+            self.version -= 1
+        else:
+            self._questions[delta.section] = _splice(self._questions[delta.section], delta.positions, delta.before, delta.after)
+            self._texts[delta.section] = delta.text_after
+            self.version += 1
+            self._undo.append(delta)
+            del self._undo[:-MAX_UNDO]
+
+    # Function to take a freshly generated section; the text is kept exactly as generated. Returns False if unchanged.
+    def load(self, section, text):
+        if text == self._texts[section]:
+            return False
+        self._apply(Delta(section, None, self._questions[section], tuple(parse_questions(text, section)), self._texts[section], text))
+        return True
+
+    # Function to put new questions in place of the ones at `positions` (a dict position -> question)
+    def replace(self, section, replacements):
+        if not replacements:
+            return
+        positions = tuple(sorted(replacements))
+        current = self._questions[section]
+        after = tuple(replacements[position] for position in positions)
+        self._apply(Delta(
+            section, positions, tuple(current[position] for position in positions), after,
+            self._texts[section], format_questions(_splice(current, positions, (None,) * len(positions), after)),
+        ))
+
+    def remove(self, section, positions):
+        positions = tuple(sorted(set(positions)))
+        if not positions:
+            return
+        current = self._questions[section]
+        before = tuple(current[position] for position in positions)
+        self._apply(Delta(
+            section, positions, before, (), self._texts[section], format_questions(_splice(current, positions, before, ())),
+        ))
+
+    # Function to revert the last change; returns the section it touched, or None when there is nothing to undo
+    def undo(self):
+        if not self._undo:
+            return None
+        delta = self._undo.pop()
+        self._apply(delta, undo=True)
+        return delta.section
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+
+from question_parser import Question
+
+# Persistent store of every generated question; override with QPG_BANK_PATH
+BANK_PATH = os.getenv(
+    "QPG_BANK_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "question_bank.sqlite3"),
+)
+# A question used in a paper is not handed out again for this many days
+REUSE_AFTER_DAYS = float(os.getenv("QPG_BANK_REUSE_DAYS", 30))
+
+# Longest syllabus words make the most selective full-text query
+_MAX_QUERY_TERMS = 20
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]{3,}")
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+# Function to normalise a subject name the way the bank indexes it
+def subject_key(subject):
+    return _normalize(subject)
+
+
+# Function to fingerprint a syllabus so trivial whitespace or case edits still match
+def syllabus_hash(syllabus):
+    return hashlib.sha256(_normalize(syllabus).encode("utf-8")).hexdigest()[:16]
+
+
+def _topic_query(syllabus):
+    words = sorted({word.lower() for word in _WORD.findall(syllabus)}, key=len, reverse=True)
+    return " OR ".join(f'"{word}"' for word in words[:_MAX_QUERY_TERMS])
+
+
+# SQLite question bank with an FTS5 index over question stems
+class QuestionBank:
+    def __init__(self, path=BANK_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    subject TEXT NOT NULL,
+                    subject_key TEXT NOT NULL,
+                    syllabus_hash TEXT NOT NULL,
+                    question_type TEXT NOT NULL,
+                    bloom TEXT,
+                    stem TEXT NOT NULL,
+                    stem_key TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL,
+                    use_count INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (subject_key, question_type, stem_key)
+                );
+                CREATE INDEX IF NOT EXISTS questions_lookup
+                    ON questions (subject_key, question_type, syllabus_hash, bloom);
+                CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts
+                    USING fts5(stem, content='questions', content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+                    INSERT INTO questions_fts (rowid, stem) VALUES (new.id, new.stem);
+                END;
+                CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+                    INSERT INTO questions_fts (questions_fts, rowid, stem) VALUES ('delete', old.id, old.stem);
+                END;
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # Store generated questions; ones already in the bank are skipped. With used=True they count as used now.
+    def add(self, subject, syllabus, question_type, questions, used=True):
+        now = time.time()
+        rows = [
+            (
+                subject,
+                _normalize(subject),
+                syllabus_hash(syllabus),
+                question_type,
+                question.bloom,
+                question.stem,
+                _normalize(question.stem),
+                json.dumps(list(question.options)),
+                now,
+                now if used else None,
+                1 if used else 0,
+            )
+            for question in questions
+        ]
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.executemany(
+                """
+                INSERT OR IGNORE INTO questions (
+                    subject, subject_key, syllabus_hash, question_type, bloom, stem, stem_key,
+                    options, created_at, last_used_at, use_count
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            return cursor.rowcount
+
+    # Take up to `limit` questions not used recently for this subject, type and level, and mark them used.
+    # Questions written for the same syllabus come first, then ones whose stems match its topics.
+    def take(self, subject, syllabus, question_type, bl_level, limit, reuse_after_days=REUSE_AFTER_DAYS):
+        if limit <= 0:
+            return []
+        now = time.time()
+        filters = "q.subject_key = ? AND q.question_type = ? AND (q.last_used_at IS NULL OR q.last_used_at < ?)"
+        params = [_normalize(subject), question_type, now - reuse_after_days * 86400]
+        if bl_level != "Random (All Levels)":
+            filters += " AND q.bloom = ?"
+            params.append(bl_level)
+
+        with closing(self._connect()) as conn, conn:
+            # Hold the write lock from the first read so two sessions can't hand out the same question
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"""
+                SELECT q.id, q.stem, q.options, q.bloom FROM questions q
+                WHERE {filters} AND q.syllabus_hash = ?
+                ORDER BY q.use_count, RANDOM() LIMIT ?
+                """,
+                params + [syllabus_hash(syllabus), limit],
+            ).fetchall()
+            query = _topic_query(syllabus)
+            if len(rows) < limit and query:
+                taken = [row[0] for row in rows]
+                rows += conn.execute(
+                    f"""
+                    SELECT q.id, q.stem, q.options, q.bloom FROM questions_fts
+                    JOIN questions q ON q.id = questions_fts.rowid
+                    WHERE questions_fts MATCH ? AND {filters}
+                        AND q.id NOT IN ({",".join("?" * len(taken))})
+                    ORDER BY questions_fts.rank LIMIT ?
+                    """,
+                    [query] + params + taken + [limit - len(rows)],
+                ).fetchall()
+            conn.executemany(
+                "UPDATE questions SET last_used_at = ?, use_count = use_count + 1 WHERE id = ?",
+                [(now, row[0]) for row in rows],
+            )
+        return [
+            Question(number, stem, tuple(json.loads(options)), bloom)
+            for number, (_, stem, options, bloom) in enumerate(rows, start=1)
+        ]
+
+    # All stems stored for a subject, used as the history for duplicate checks
+    def stems(self, subject):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT stem FROM questions WHERE subject_key = ?", (subject_key(subject),))
+            return [row[0] for row in rows]
+
+    def count(self, subject=None):
+        with closing(self._connect()) as conn:
+            if subject is None:
+                return conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE subject_key = ?", (_normalize(subject),)
+            ).fetchone()[0]
@@ -0,0 +1,145 @@
+import re
+from dataclasses import dataclass
+
+# "Q1." / "Q12)" / "**Q3:**" at the start of a line, followed by the stem
+_QUESTION_LINE = re.compile(r"\**[ \t]*Q[ \t]*(\d+)[ \t]*[.):]\**[ \t]*(.*)", re.IGNORECASE)
+# "(a)" anywhere, or "a)" / "a." at the start of a line, introducing an option
+_OPTION_MARK = re.compile(r"(?:\(([a-dA-D])\)|^([a-dA-D])[.)])[ \t]*")
+# Bloom's short code such as "[BL2]" (brackets optional) at the end of a stem or option line
+_BLOOM_CODE = re.compile(r"[ \t]*\[?\b(BL[1-6])\b\]?[ \t]*$", re.IGNORECASE)
+# Short and long answer questions use "(a)", "(b)" for sub-parts, which must stay in the stem
+_NO_OPTION_SECTIONS = {"short_questions", "long_questions"}
+
+
+# One generated question; slots keep large batches compact
+@dataclass(slots=True)
+class Question:
+    number: int
+    stem: str
+    options: tuple = ()
+    bloom: str | None = None
+    section: str | None = None
+
+    # Function to format the question back into the layout the prompts ask for
+    def to_text(self, number=None):
+        text = f"Q{self.number if number is None else number}. {self.stem}"
+        if self.bloom:
+            text += f" [{self.bloom}]"
+        if self.options:
+            text += "\n" + " ".join(f"({letter}) {option}" for letter, option in zip("abcd", self.options))
+        return text
+
+
+def _split_options(text):
+    marks = list(_OPTION_MARK.finditer(text))
+    options = []
+    for i, mark in enumerate(marks):
+        end = marks[i + 1].start() if i + 1 < len(marks) else len(text)
+        options.append(text[mark.end():end].strip())
+    return options
+
+
+# Incremental parser: feed it text chunks as they stream in and it returns each question once complete
+class QuestionStreamParser:
+    __slots__ = ("section", "_with_options", "_partial", "_number", "_stem", "_options", "_bloom")
+
+    def __init__(self, section=None):
+        self.section = section
+        self._with_options = section not in _NO_OPTION_SECTIONS
+        # Pieces of the current, not yet terminated line; only joined once its newline arrives
+        self._partial = []
+        self._number = None
+        self._stem = []
+        self._options = []
+        self._bloom = None
+
+    def feed(self, chunk):
+        completed = []
+        newline = chunk.rfind("\n")
+        if newline < 0:
+            self._partial.append(chunk)
+            return completed
+        self._partial.append(chunk[:newline])
+        lines = "".join(self._partial).split("\n")
+        self._partial = [chunk[newline + 1:]] if newline + 1 < len(chunk) else []
+        for line in lines:
+            question = self._line(line)
+            if question is not None:
+                completed.append(question)
+        return completed
+
+    # Function to flush the last question once the stream has ended
+    def close(self):
+        completed = []
+        if self._partial:
+            question = self._line("".join(self._partial))
+            self._partial = []
+            if question is not None:
+                completed.append(question)
+        question = self._finish()
+        if question is not None:
+            completed.append(question)
+        return completed
+
+    def _line(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        match = _QUESTION_LINE.match(line)
+        if match:
+            finished = self._finish()
+            self._number = int(match.group(1))
+            self._add_text(match.group(2))
+            return finished
+        if self._number is None:
+            # Preamble such as "Here are 10 questions:" before the first question
+            return None
+        self._add_text(line)
+        return None
+
+    def _add_text(self, text):
+        bloom = _BLOOM_CODE.search(text)
+        if bloom:
+            self._bloom = bloom.group(1).upper()
+            text = text[:bloom.start()]
+        option_start = _OPTION_MARK.search(text) if self._with_options else None
+        if option_start:
+            stem_text = text[:option_start.start()].strip()
+            if stem_text and not self._options:
+                self._stem.append(stem_text)
+            self._options.extend(_split_options(text[option_start.start():]))
+        elif not self._options and text.strip():
+            self._stem.append(text.strip())
+        # Any other text after the options is stray output and is dropped
+
+    def _finish(self):
+        if self._number is None:
+            return None
+        stem = " ".join(self._stem)
+        question = None
+        if stem:
+            question = Question(self._number, stem, tuple(self._options[:4]), self._bloom, self.section)
+        self._number = None
+        self._stem = []
+        self._options = []
+        self._bloom = None
+        return question
+
+
+# Function to parse a whole block of generated text into questions
+def parse_questions(text, section=None):
+    parser = QuestionStreamParser(section)
+    return parser.feed(text) + parser.close()
+
+
+# Function to turn a stream of text chunks into a stream of questions
+def iter_questions(chunks, section=None):
+    parser = QuestionStreamParser(section)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+# Function to format questions as one continuously numbered block (Q1..Qn)
+def format_questions(questions):
+    return "\n\n".join(question.to_text(number) for number, question in enumerate(questions, start=1))
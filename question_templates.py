@@ -0,0 +1,129 @@
+import csv
+import importlib.util
+import io
+import random
+from bisect import bisect_right
+from itertools import accumulate
+
+from bloom_classifier import LEVELS, blooms_taxonomy
+
+# Most questions one bulk run may ask for
+MAX_BULK_QUESTIONS = 100_000
+
+TEMPLATE_FIELDS = ["Question", "Topic", "Bloom's Level", "Starter", "Verb"]
+
+# Export format -> (file extension, MIME type, package pandas needs to write it)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv", None),
+    "Parquet": ("parquet", "application/vnd.apache.parquet", "pyarrow"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "openpyxl"),
+}
+
+# Level -> (verb-led sentence that a rendered starter question completes after the colon, the level's verbs
+# that read as an imperative in that sentence)
+LEVEL_TEMPLATES = {
+    "Remember": ("{verb} the key terms of {topic}: {question}", ["define", "list", "recall", "state", "identify", "name", "recognize", "memorize"]),
+    "Understand": ("{verb} {topic} in your own words: {question}", ["explain", "describe", "discuss", "summarize", "paraphrase", "interpret", "report"]),
+    "Apply": ("{verb} {topic} in a worked example: {question}", ["apply", "use", "employ", "demonstrate", "illustrate", "implement"]),
+    "Analyze": ("{verb} the parts of {topic}: {question}", ["differentiate", "organize", "relate", "compare", "contrast", "distinguish", "examine", "analyze", "categorize", "diagram"]),
+    "Evaluate": ("{verb} {topic} with evidence: {question}", ["appraise", "judge", "assess", "evaluate", "critique", "defend", "support", "weigh"]),
+    "Create": ("{verb} something new from {topic}: {question}", ["design", "assemble", "construct", "develop", "formulate", "create", "compose", "generate", "plan", "produce", "devise", "invent"]),
+}
+
+# Starters that would leave a dangling clause with the topic just appended -> the same question with "__" for the topic
+STARTER_FORMS = {
+    "Who was...": "Who was involved in __",
+    "When did...": "When did __ happen",
+    "Can you explain what is happening...": "Can you explain what is happening in __",
+    "What examples can you find to...": "What examples can you find to illustrate __",
+    "How would you organize __ to show...": "How would you organize __ to show its main ideas",
+    "How is __ related to...": "How is __ related to the topics around it",
+    "Why do you think...": "Why do you think __ matters",
+    "What is the theme...": "What is the theme of __",
+    "What motive is there...": "What motive is there behind __",
+    "What conclusions can you draw...": "What conclusions can you draw about __",
+    "Do you agree with the actions...": "Do you agree with the actions taken in __",
+    "What choice would you have made...": "What choice would you have made about __",
+    "What data was used to make the conclusion...": "What data was used to make the conclusion about __",
+    "What would happen if...": "What would happen if __ changed",
+    "Can you design a __ to...": "Can you design a __ model to explain how it works",
+    "How would you devise your own way to...": "How would you devise your own way to explain __",
+}
+
+
+# Function to fill a question starter with a topic: "__" marks where the topic goes, otherwise it follows "..."
+def render_question(topic, starter):
+    starter = STARTER_FORMS.get(starter, starter)
+    if "__" in starter:
+        text = starter.replace("__", topic).replace("...", "")
+    elif "..." in starter:
+        text = starter.replace("...", f" {topic}")
+    else:
+        text = f"{starter} {topic}"
+    return text.rstrip(" ?.") + "?"
+
+
+# Every templated question for a set of topics and levels: one per topic, level, starter and verb.
+# Questions are addressed by index, so a seeded sample of indices gives unique questions without building the pool.
+class TemplatePool:
+    def __init__(self, topics, levels=LEVELS):
+        # Blank and repeated topics would only give repeated questions
+        self.topics = []
+        seen = set()
+        for topic in topics:
+            topic = topic.strip()
+            if topic and topic.lower() not in seen:
+                seen.add(topic.lower())
+                self.topics.append(topic)
+        self.levels = [level for level in LEVELS if level in levels]
+        self._blocks = [(topic, level) for topic in self.topics for level in self.levels]
+        sizes = [len(blooms_taxonomy[level]["question_starters"]) * len(LEVEL_TEMPLATES[level][1]) for _, level in self._blocks]
+        self._offsets = [0] + list(accumulate(sizes))
+
+    @property
+    def size(self):
+        return self._offsets[-1]
+
+    # Function to build question number `index` as a row of TEMPLATE_FIELDS
+    def question(self, index):
+        block = bisect_right(self._offsets, index) - 1
+        topic, level = self._blocks[block]
+        template, verbs = LEVEL_TEMPLATES[level]
+        starter_index, verb_index = divmod(index - self._offsets[block], len(verbs))
+        starter = blooms_taxonomy[level]["question_starters"][starter_index]
+        verb = verbs[verb_index]
+        question = render_question(topic, starter)
+        text = template.format(verb=verb.capitalize(), topic=topic, question=question[0].lower() + question[1:])
+        return (text, topic, level, starter, verb)
+
+    # Function to draw `count` different questions in an order fixed by `seed`; the same seed gives the same questions
+    def sample(self, count, seed=None):
+        indices = random.Random(seed).sample(range(self.size), min(count, self.size))
+        return [self.question(index) for index in indices]
+
+
+# Function to list the export formats whose writer is installed
+def available_formats():
+    return [name for name, (_, _, package) in EXPORT_FORMATS.items() if package is None or importlib.util.find_spec(package)]
+
+
+# Function to write template rows as a CSV, Parquet or XLSX file
+def export_bytes(rows, export_format):
+    if export_format == "CSV":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(TEMPLATE_FIELDS)
+        writer.writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+    package = EXPORT_FORMATS[export_format][2]
+    if importlib.util.find_spec(package) is None:
+        raise ValueError(f"Exporting {export_format} needs the {package} package (pip install {package}).")
+    import pandas as pd  # type: ignore
+
+    frame = pd.DataFrame(rows, columns=TEMPLATE_FIELDS)
+    buffer = io.BytesIO()
+    if export_format == "Parquet":
+        frame.to_parquet(buffer, index=False)
+    else:
+        frame.to_excel(buffer, index=False, sheet_name="Questions")
+    return buffer.getvalue()
@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+
+import telemetry
+
+# Groq free-tier limits for llama3-70b-8192; override per run from the command line
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 6000
+
+# HTTP statuses worth retrying: rate limited or a transient server error
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+# Token bucket refilled continuously at `rate` units per minute, holding at most `capacity` units
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate / 60.0
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # Block until `amount` units are available, then take them; returns the time spent waiting
+    def acquire(self, amount=1):
+        # A request larger than the bucket can never fit, so let it drain the whole bucket instead
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# Paces calls against both the requests/min and tokens/min limits of the API
+class RateLimiter:
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, estimated_tokens):
+        return self.requests.acquire(1) + self.tokens.acquire(estimated_tokens)
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+# Function to decide whether an error from the LLM client is worth retrying
+def is_retryable(exc):
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # Connection drops and timeouts carry no status code
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "TimeoutError"}
+
+
+# Function to read how long the server asked us to wait (the Retry-After header), in seconds; 0 if it didn't say
+def retry_after(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# Function to call fn() and retry 429/5xx failures with exponential backoff and full jitter
+def call_with_retries(fn, max_retries=5, base_delay=1.0, max_delay=60.0, on_retry=None):
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt >= max_retries or not is_retryable(exc):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            # Never retry sooner than the server asked us to
+            delay = max(delay, retry_after(exc))
+            attempt += 1
+            telemetry.record_retry(attempt, exc, delay)
+            if on_retry is not None:
+                on_retry(attempt, exc, delay)
+            time.sleep(delay)
@@ -0,0 +1,73 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from generation_service import submit
+from syllabus import MAX_TOPIC_CHARS, plan_batches, split_topics
+
+# Questions requested per LLM call in sharded mode
+DEFAULT_BATCH_SIZE = 10
+# Batches of one sharded request in flight at once. How many calls run across all users, and in what order,
+# is left to the generation service's fair scheduler.
+MAX_CONCURRENT_BATCHES = 4
+# How many extra rounds to run when the model returns fewer questions than asked for
+MAX_TOP_UP_ROUNDS = 3
+
+# Matches the "Q1." / "Q12)" / "**Q3:**" prefix that starts every generated question
+QUESTION_START = re.compile(r"^[ \t]*\**[ \t]*Q[ \t]*\d+[ \t]*[.):]\**[ \t]*", re.IGNORECASE | re.MULTILINE)
+
+
+# Function to split a requested count into fixed-size batches
+def split_count(total, batch_size=DEFAULT_BATCH_SIZE):
+    return [min(batch_size, total - start) for start in range(0, total, batch_size)]
+
+
+# Function to split generated text into question bodies, dropping the "Qn." prefixes and any preamble
+def split_questions(text):
+    starts = [match for match in QUESTION_START.finditer(text)]
+    questions = []
+    for i, match in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(text)
+        body = text[match.end():end].strip()
+        if body:
+            questions.append(body)
+    return questions
+
+
+# Function to join question bodies back into a continuously numbered block (Q1..Qn)
+def renumber_questions(questions):
+    return "\n\n".join(f"Q{number}. {body}" for number, body in enumerate(questions, start=1))
+
+
+def _run_batch(generator, subject_name, syllabus, count, bl_level, shard):
+    # The shard number lets identical batch prompts be told apart (e.g. by the response cache)
+    return split_questions(generator(subject_name, syllabus, count, bl_level, shard=shard))
+
+
+# Function to generate a section as parallel per-topic batches (map), then merge them in syllabus order and top up (reduce)
+def generate_sharded(generator, subject_name, syllabus, count, bl_level, batch_size=DEFAULT_BATCH_SIZE, max_chars=MAX_TOPIC_CHARS):
+    if count <= 0:
+        return ""
+    plan = plan_batches(split_topics(syllabus, max_chars), count, batch_size, max_chars) or [(syllabus, count)]
+    jobs = [(shard, syllabus_slice, size) for shard, (syllabus_slice, size) in enumerate(plan)]
+    questions = []
+    with ThreadPoolExecutor(max_workers=min(len(jobs), MAX_CONCURRENT_BATCHES)) as executor:
+        futures = [submit(executor, _run_batch, generator, subject_name, job[1], job[2], bl_level, job[0]) for job in jobs]
+        for (_, _, size), future in zip(jobs, futures):
+            questions.extend(future.result()[:size])
+
+        # Top up short batches, cycling through the topics so each prompt stays small
+        shard = len(jobs)
+        for _ in range(MAX_TOP_UP_ROUNDS):
+            missing = count - len(questions)
+            if missing <= 0:
+                break
+            top_ups = [
+                (shard + i, plan[(shard + i) % len(plan)][0], size)
+                for i, size in enumerate(split_count(missing, batch_size))
+            ]
+            futures = [submit(executor, _run_batch, generator, subject_name, job[1], job[2], bl_level, job[0]) for job in top_ups]
+            shard += len(top_ups)
+            for (_, _, size), future in zip(top_ups, futures):
+                questions.extend(future.result()[:size])
+
+    return renumber_questions(questions[:count])
@@ -0,0 +1,104 @@
+import random
+import re
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel  # type: ignore
+from langchain_core.messages import AIMessage, AIMessageChunk  # type: ignore
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult  # type: ignore
+
+_COUNT = re.compile(r"generate (\d+)", re.IGNORECASE)
+_LEVEL = re.compile(r"Generate ONLY (BL[1-6])")
+_SUBJECT = re.compile(r"Subject:\s*(.*)")
+# Word pool for canned stems; each stem draws its own words so stems don't look like near-duplicates
+_VOCAB = (
+    "abstraction algorithm architecture boundary cache channel compiler concurrency constraint dataset "
+    "dependency distribution efficiency encoding entropy framework gradient hierarchy interface kernel "
+    "latency lifecycle mapping migration model network optimisation pipeline protocol quality recursion "
+    "redundancy replication resource scheduling security sequence signal storage structure synchronisation "
+    "threshold throughput topology transaction validation variance workflow"
+).split()
+# Stem shapes picked per question. Like real completions, most carry no verb the analyzer knows, and the level
+# tag is the only hint of the level; "Describe" reads as BL2 whatever level was asked for.
+_STEMS = (
+    "Which statement about the {words} of {subject} is correct?",
+    "Write a note on the {words} of {subject}.",
+    "Describe the {words} of {subject}.",
+)
+
+
+# Raised by the stub in place of Groq's 429 response; retried and failed over like the real one
+class StubRateLimitError(Exception):
+    status_code = 429
+
+
+# Local stand-in for ChatGroq: answers every prompt with the requested number of canned questions.
+# `latency` is the delay before the first token and `tokens_per_second` paces the rest (0 = instant);
+# `completion` replaces the canned questions with fixed text, and `error_rate` is the share of calls that fail with a 429.
+class StubChatModel(BaseChatModel):
+    model_name: str = "stub"
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    completion: str | None = None
+    temperature: float = 0.0
+    max_tokens: int | None = None
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _complete(self, messages):
+        if self.completion is not None:
+            return self.completion
+        prompt = messages[-1].content
+        count_match = _COUNT.search(prompt)
+        level_match = _LEVEL.search(prompt)
+        subject_match = _SUBJECT.search(prompt)
+        count = int(count_match.group(1)) if count_match else 1
+        subject = subject_match.group(1).strip() if subject_match else "the subject"
+        lines = []
+        for number in range(1, count + 1):
+            level = level_match.group(1) if level_match else f"BL{(number - 1) % 6 + 1}"
+            # Seeded by the whole prompt, so different syllabus slices or exclusion lists give different stems
+            rng = random.Random(f"{prompt}-{number}")
+            stem = rng.choice(_STEMS).format(words=" ".join(rng.sample(_VOCAB, 5)), subject=subject)
+            lines.append(f"Q{number}. {stem} [{level}]")
+            if "multiple-choice" in prompt:
+                lines.append("(a) Option one (b) Option two (c) Option three (d) Option four")
+        return "\n".join(lines)
+
+    # Token counts reported the way ChatGroq reports them, approximated at four characters per token
+    def _usage(self, messages, text):
+        input_tokens = len(messages[-1].content) // 4
+        output_tokens = len(text) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    # Simulated decoding time for `text`, at the same four characters per token
+    def _decode_seconds(self, text):
+        return len(text) / 4 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _fail_sometimes(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise StubRateLimitError(f"{self.model_name}: rate limit reached")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._fail_sometimes()
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._complete(messages)
+        if self.tokens_per_second:
+            time.sleep(self._decode_seconds(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._fail_sometimes()
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._complete(messages)
+        for line in text.splitlines(keepends=True):
+            if self.tokens_per_second:
+                time.sleep(self._decode_seconds(line))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=line))
+        # Like Groq, usage arrives on a final empty chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, text)))
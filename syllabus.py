@@ -0,0 +1,158 @@
+import io
+import re
+from dataclasses import dataclass
+
+# A syllabus longer than this is never sent whole; it is generated topic by topic instead (about 1k tokens)
+MAX_SYLLABUS_CHARS = 4000
+# Largest piece of syllabus text put into one prompt
+MAX_TOPIC_CHARS = 1500
+
+# "Unit 1", "UNIT - II: Trees", "Module 3.", "Chapter 4 Sorting", "Week 5 -" at the start of a line
+_UNIT_HEADING = re.compile(
+    r"^(?:unit|module|chapter|part|section|week|topic)\s*[-:.]?\s*([0-9]+|[ivxlc]+)\b[\s:.\-–—)]*(.*)$",
+    re.IGNORECASE,
+)
+# Teaching time stated next to a unit, e.g. "(8 hours)", "10 hrs", "[6L]", "12 lectures"
+_HOURS = re.compile(r"(\d+(?:\.\d+)?)\s*(?:hours?|hrs?|lectures?|periods?|sessions?|L\b)", re.IGNORECASE)
+_BULLET = re.compile(r"^(?:[-*•▪●]|\d+[.)]|[a-z][.)])\s+", re.IGNORECASE)
+
+
+# One unit or topic of a syllabus; weight decides its share of the questions
+@dataclass(slots=True)
+class Topic:
+    title: str
+    text: str
+    weight: float
+
+
+# Function to extract plain text from an uploaded PDF, DOCX or TXT syllabus
+def read_syllabus(data, name):
+    name = name.lower()
+    if name.endswith(".pdf"):
+        try:
+            from pypdf import PdfReader  # type: ignore
+        except ImportError as exc:
+            raise ValueError("Reading PDF syllabi needs the pypdf package (pip install pypdf).") from exc
+        reader = PdfReader(io.BytesIO(data))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    if name.endswith(".docx"):
+        import docx  # type: ignore
+
+        document = docx.Document(io.BytesIO(data))
+        return "\n".join(paragraph.text for paragraph in document.paragraphs)
+    return data.decode("utf-8", errors="replace")
+
+
+def _weight(heading, text):
+    hours = _HOURS.search(heading) or _HOURS.search(text[:200])
+    if hours:
+        return float(hours.group(1))
+    # Without stated hours, longer units are assumed to carry more material
+    return float(max(len(text.split()), 1))
+
+
+def _split_long(topic, max_chars):
+    if len(topic.text) <= max_chars:
+        return [topic]
+    # Split on lines, falling back to sentences, and share the weight by length
+    pieces = [line for line in topic.text.splitlines() if line.strip()]
+    if len(pieces) == 1:
+        pieces = re.split(r"(?<=[.;])\s+", topic.text)
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece[:max_chars]
+    if current:
+        chunks.append(current)
+    total = sum(len(chunk) for chunk in chunks)
+    return [
+        Topic(f"{topic.title} ({part}/{len(chunks)})", chunk, topic.weight * len(chunk) / total)
+        for part, chunk in enumerate(chunks, start=1)
+    ]
+
+
+# Function to segment a syllabus into topics: unit headings when there are any, otherwise lines or comma-separated items
+def split_topics(syllabus, max_chars=MAX_TOPIC_CHARS):
+    lines = [line.strip() for line in syllabus.splitlines() if line.strip()]
+    units = []
+    for line in lines:
+        heading = _UNIT_HEADING.match(line)
+        if heading:
+            units.append([line])
+        elif units:
+            units[-1].append(line)
+    topics = []
+    if len(units) > 1:
+        for unit in units:
+            text = "\n".join(unit)
+            topics.append(Topic(unit[0][:80], text, _weight(unit[0], text)))
+    else:
+        items = lines if len(lines) > 1 else [item.strip() for item in re.split(r"[,;]", syllabus) if item.strip()]
+        for item in items:
+            item = _BULLET.sub("", item)
+            topics.append(Topic(item[:80], item, _weight(item, item)))
+    if not topics:
+        return [Topic(syllabus[:80], syllabus, 1.0)] if syllabus.strip() else []
+    return [piece for topic in topics for piece in _split_long(topic, max_chars)]
+
+
+# Function to share `total` questions across topics in proportion to weight (largest remainder);
+# with at_least_one, every topic gets a question when there are enough to go round
+def allocate_counts(weights, total, at_least_one=True):
+    if not weights or total <= 0:
+        return [0] * len(weights)
+    floor = 1 if at_least_one and total >= len(weights) else 0
+    remaining = total - floor * len(weights)
+    weight_sum = sum(weights) or len(weights)
+    shares = [remaining * (weight or (weight_sum / len(weights))) / weight_sum for weight in weights]
+    counts = [floor + int(share) for share in shares]
+    leftover = total - sum(counts)
+    by_remainder = sorted(range(len(weights)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:leftover]:
+        counts[i] += 1
+    return counts
+
+
+def _merge(topics, max_chars):
+    text = "\n".join(topic.text for topic in topics)
+    if len(text) > max_chars:
+        # Too long to send whole: keep every topic's title so the prompt still spans the group
+        text = "\n".join(topic.title for topic in topics)[:max_chars]
+    return Topic(topics[0].title, text, sum(topic.weight for topic in topics))
+
+
+# Function to plan the map step: a list of (syllabus_text, question_count) prompts that together cover
+# every topic, with no prompt over max_chars of syllabus or batch_size questions
+def plan_batches(topics, count, batch_size, max_chars=MAX_TOPIC_CHARS):
+    if count <= 0 or not topics:
+        return []
+    if count < len(topics):
+        # Fewer questions than topics: group neighbouring topics so each group still gets a question
+        topics = [
+            _merge(topics[i * len(topics) // count:(i + 1) * len(topics) // count], max_chars)
+            for i in range(count)
+        ]
+    counts = allocate_counts([topic.weight for topic in topics], count)
+    batches = []
+    texts, size = [], 0
+    for topic, allocated in zip(topics, counts):
+        if texts and (size + allocated > batch_size or len("\n".join(texts)) + len(topic.text) + 1 > max_chars):
+            batches.append(("\n".join(texts), size))
+            texts, size = [], 0
+        while allocated > batch_size:
+            batches.append((topic.text, batch_size))
+            allocated -= batch_size
+        texts.append(topic.text)
+        size += allocated
+    if texts:
+        batches.append(("\n".join(texts), size))
+    return [(text, size) for text, size in batches if size > 0]
+
+
+# Function to shorten a syllabus for a single prompt: unchanged if it fits, otherwise its topic titles
+def fit_syllabus(syllabus, max_chars=MAX_SYLLABUS_CHARS):
+    if len(syllabus) <= max_chars:
+        return syllabus
+    return "\n".join(topic.title for topic in split_topics(syllabus))[:max_chars]
@@ -0,0 +1,280 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+# Where the JSON event log, the Prometheus export and saved profiles go; override with QPG_TELEMETRY_DIR
+TELEMETRY_DIR = os.getenv(
+    "QPG_TELEMETRY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "telemetry"),
+)
+LOG_PATH = os.path.join(TELEMETRY_DIR, "events.jsonl")
+METRICS_PATH = os.path.join(TELEMETRY_DIR, "metrics.prom")
+PROFILE_DIR = os.path.join(TELEMETRY_DIR, "profiles")
+# Set QPG_PROFILE=1 to profile every rerun (or add ?profile=1 to a page URL for that session's reruns)
+PROFILE_ENABLED = os.getenv("QPG_PROFILE") == "1"
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+MAX_PROFILES = 20
+# The Prometheus file is rewritten at most this often
+METRICS_WRITE_INTERVAL = 5.0
+# Events kept in memory for the admin page
+RECENT_EVENTS = 500
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Metric name -> (type, help text) for the Prometheus export
+METRICS = {
+    "qpg_llm_calls_total": ("counter", "LLM requests by question type, model and cache outcome (hit, miss, bypass, coalesced)"),
+    "qpg_llm_call_seconds": ("histogram", "Wall time of LLM requests that reached the model"),
+    "qpg_llm_queue_seconds": ("histogram", "Time an LLM request waited for a free slot in the shared generation service"),
+    "qpg_llm_first_token_seconds": ("histogram", "Time to the first streamed token"),
+    "qpg_llm_prompt_tokens_total": ("counter", "Prompt tokens reported by the model"),
+    "qpg_llm_completion_tokens_total": ("counter", "Completion tokens reported by the model"),
+    "qpg_llm_retries_total": ("counter", "Retried LLM calls by error type"),
+    "qpg_router_calls_total": ("counter", "LLM call attempts by model and outcome (ok, or the error type), failed-over attempts included"),
+    "qpg_docx_builds_total": ("counter", "DOCX exports by cache outcome"),
+    "qpg_docx_build_seconds": ("histogram", "Time to render a DOCX document"),
+    "qpg_analyze_questions_total": ("counter", "Questions classified by the Bloom analyzer"),
+    "qpg_analyze_seconds": ("histogram", "Time to classify one batch of questions"),
+    "qpg_rerun_seconds": ("histogram", "Wall time of a Streamlit script run by page"),
+}
+
+
+# In-process counters and histograms, keyed by metric name and sorted label pairs
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.events = deque(maxlen=RECENT_EVENTS)
+        self.metrics_written_at = 0.0
+
+
+_registry = _Registry()
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _registry.lock:
+        _registry.counters[key] = _registry.counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels(labels))
+    with _registry.lock:
+        buckets, total, count = _registry.histograms.get(key, ([0] * len(LATENCY_BUCKETS), 0.0, 0))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        _registry.histograms[key] = (buckets, total + seconds, count + 1)
+
+
+@lru_cache(maxsize=None)
+def _logger():
+    os.makedirs(TELEMETRY_DIR, exist_ok=True)
+    logger = logging.getLogger("qpg.telemetry")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+
+# Function to append one structured event to the JSON log (one object per line)
+def log_event(event, **fields):
+    record = {"ts": round(time.time(), 3), "event": event, **fields}
+    with _registry.lock:
+        _registry.events.append(record)
+    _logger().info(json.dumps(record, default=str))
+
+
+# Function to record one LLM request; cache is "hit", "miss", "bypass" or "coalesced" (joined another session's call)
+def record_llm_call(question_type, model, seconds, cache, first_token_seconds=None, prompt_tokens=None, completion_tokens=None, streamed=False):
+    increment("qpg_llm_calls_total", question_type=question_type, model=model, cache=cache)
+    # Hits and coalesced requests cost no call of their own
+    if cache not in ("hit", "coalesced"):
+        observe("qpg_llm_call_seconds", seconds, question_type=question_type, model=model)
+        if first_token_seconds is not None:
+            observe("qpg_llm_first_token_seconds", first_token_seconds, question_type=question_type, model=model)
+        if prompt_tokens:
+            increment("qpg_llm_prompt_tokens_total", prompt_tokens, model=model)
+        if completion_tokens:
+            increment("qpg_llm_completion_tokens_total", completion_tokens, model=model)
+    log_event(
+        "llm_call",
+        question_type=question_type,
+        model=model,
+        cache=cache,
+        streamed=streamed,
+        seconds=round(seconds, 4),
+        first_token_seconds=None if first_token_seconds is None else round(first_token_seconds, 4),
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+    )
+
+
+# Function to record a retried call (rate limit, server error, timeout)
+def record_retry(attempt, exc, delay):
+    increment("qpg_llm_retries_total", error=type(exc).__name__)
+    log_event("llm_retry", attempt=attempt, error=f"{type(exc).__name__}: {exc}", delay=round(delay, 3))
+
+
+# Context manager timing a block into a histogram and the event log; extra fields can be added to the yielded dict
+@contextmanager
+def timed(name, event, **labels):
+    fields = {}
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - started
+        observe(name, seconds, **labels)
+        log_event(event, seconds=round(seconds, 4), **labels, **fields)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+# Function to render every metric in the Prometheus text exposition format
+def prometheus_text():
+    with _registry.lock:
+        counters = dict(_registry.counters)
+        histograms = {key: (list(value[0]), value[1], value[2]) for key, value in _registry.histograms.items()}
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        else:
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {bucket}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# Function to write the Prometheus export for a node_exporter textfile collector; throttled unless force=True
+def write_metrics(path=METRICS_PATH, force=False):
+    now = time.monotonic()
+    with _registry.lock:
+        if not force and now - _registry.metrics_written_at < METRICS_WRITE_INTERVAL:
+            return None
+        _registry.metrics_written_at = now
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a scraper never reads a half-written file
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "w", encoding="utf-8") as metrics:
+        metrics.write(prometheus_text())
+    os.replace(partial, path)
+    return path
+
+
+# Function to copy the current metrics for display: counters as rows, histograms with count, mean and p95
+def snapshot():
+    with _registry.lock:
+        counters = [
+            {"metric": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_registry.counters.items())
+        ]
+        histograms = []
+        for (name, labels), (buckets, total, count) in sorted(_registry.histograms.items()):
+            p95 = next((bound for bound, bucket in zip(LATENCY_BUCKETS, buckets) if bucket >= 0.95 * count), float("inf"))
+            histograms.append({
+                "metric": name,
+                "labels": dict(labels),
+                "count": count,
+                "mean_seconds": total / count if count else 0.0,
+                "p95_seconds_at_most": p95,
+            })
+        events = list(_registry.events)
+    return counters, histograms, events
+
+
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler  # type: ignore
+
+        profiler = Profiler()
+    except ImportError:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler.start()
+    return profiler
+
+
+def _save_profile(profiler, page):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{page}-{os.getpid()}.txt")
+    if hasattr(profiler, "output_text"):
+        profiler.stop()
+        report = profiler.output_text(unicode=True)
+    else:
+        import io
+        import pstats
+
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(60)
+        report = stream.getvalue()
+    with open(path, "w", encoding="utf-8") as output:
+        output.write(report)
+    # Keep only the newest profiles
+    for stale in sorted(os.listdir(PROFILE_DIR))[:-MAX_PROFILES]:
+        os.remove(os.path.join(PROFILE_DIR, stale))
+    return path
+
+
+# Function to call at the top of a page script; profiling uses pyinstrument when installed, else cProfile
+def start_rerun(page, profile=False):
+    profiler = _start_profiler() if profile or PROFILE_ENABLED else None
+    return page, time.perf_counter(), profiler
+
+
+# Function to call at the bottom of a page script: records the rerun time and saves its profile, if any
+def finish_rerun(rerun):
+    page, started, profiler = rerun
+    seconds = time.perf_counter() - started
+    observe("qpg_rerun_seconds", seconds, page=page)
+    fields = {"page": page, "seconds": round(seconds, 4)}
+    if profiler is not None:
+        fields["profile"] = _save_profile(profiler, page)
+    log_event("rerun", **fields)
+    write_metrics()
+
+
+# Function to list saved profiles, newest first
+def saved_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return [os.path.join(PROFILE_DIR, name) for name in sorted(os.listdir(PROFILE_DIR), reverse=True)]
@@ -0,0 +1,154 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+
+# Context window (prompt plus completion) per model
+CONTEXT_WINDOWS = {
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Starting estimates before any usage has been recorded
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_TOKENS_PER_QUESTION = {"mcq": 60, "short": 30, "long": 40}
+# Share of the context window kept free to absorb estimation error
+SAFETY_MARGIN = 0.1
+# Weight of each new observation in the running averages
+CALIBRATION_RATE = 0.2
+# Recorded calls read back at start-up, and kept on disk
+CALIBRATION_WINDOW = 200
+MAX_USAGE_ROWS = 5000
+
+# Recorded token usage; override with QPG_USAGE_PATH
+USAGE_PATH = os.getenv(
+    "QPG_USAGE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "token_usage.sqlite3"),
+)
+
+
+# Raised when a request can't be made to fit the model's context window
+class TokenBudgetError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class Estimate:
+    prompt_tokens: int
+    completion_tokens: int
+    context_window: int
+
+    @property
+    def total(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def fits(self):
+        return self.total <= usable_tokens(self.context_window)
+
+
+def usable_tokens(window):
+    return int(window * (1 - SAFETY_MARGIN))
+
+
+# Estimates prompt and completion sizes for one model, calibrated from the usage of its earlier calls
+class TokenEstimator:
+    def __init__(self, model, path=USAGE_PATH):
+        self.model = model
+        self.context_window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+        self.path = path
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN
+        self.tokens_per_question = dict(DEFAULT_TOKENS_PER_QUESTION)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage (
+                    id INTEGER PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    model TEXT NOT NULL,
+                    question_type TEXT NOT NULL,
+                    questions INTEGER NOT NULL,
+                    prompt_chars INTEGER NOT NULL,
+                    prompt_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL
+                )
+                """
+            )
+        self._load_calibration()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _load_calibration(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """
+                SELECT question_type, questions, prompt_chars, prompt_tokens, completion_tokens
+                FROM usage WHERE model = ? ORDER BY id DESC LIMIT ?
+                """,
+                (self.model, CALIBRATION_WINDOW),
+            ).fetchall()
+        prompt_chars = sum(row[2] for row in rows)
+        prompt_tokens = sum(row[3] for row in rows)
+        if prompt_chars and prompt_tokens:
+            self.chars_per_token = prompt_chars / prompt_tokens
+        for question_type in self.tokens_per_question:
+            questions = sum(row[1] for row in rows if row[0] == question_type)
+            completion = sum(row[4] for row in rows if row[0] == question_type)
+            if questions and completion:
+                self.tokens_per_question[question_type] = completion / questions
+
+    def prompt_tokens(self, prompt):
+        return math.ceil(len(prompt) / self.chars_per_token)
+
+    def completion_tokens(self, question_type, count):
+        return math.ceil(count * self.tokens_per_question[question_type])
+
+    def estimate(self, question_type, prompt, count):
+        return Estimate(self.prompt_tokens(prompt), self.completion_tokens(question_type, count), self.context_window)
+
+    # Function to split `count` questions into calls that each fit next to the prompt; raises if none fit
+    def split_count(self, question_type, prompt, count, max_tokens=None):
+        room = usable_tokens(self.context_window) - self.prompt_tokens(prompt)
+        if max_tokens:
+            room = min(room, max_tokens)
+        per_call = int(room // self.tokens_per_question[question_type])
+        if per_call < 1:
+            if max_tokens and max_tokens < self.tokens_per_question[question_type]:
+                raise TokenBudgetError(
+                    f"max_tokens={max_tokens} is too small for a single {question_type} question "
+                    f"(about {self.tokens_per_question[question_type]:.0f} tokens)."
+                )
+            raise TokenBudgetError(
+                f"The prompt needs about {self.prompt_tokens(prompt)} tokens, which leaves no room for a "
+                f"{question_type} question in the {self.context_window}-token context of {self.model}. Shorten the syllabus."
+            )
+        return [min(per_call, count - start) for start in range(0, count, per_call)]
+
+    # Function to record the real usage of one call and fold it into the running estimates
+    def record(self, question_type, questions, prompt_chars, prompt_tokens, completion_tokens):
+        with self._lock:
+            if prompt_tokens:
+                observed = prompt_chars / prompt_tokens
+                self.chars_per_token += CALIBRATION_RATE * (observed - self.chars_per_token)
+            if questions and completion_tokens:
+                observed = completion_tokens / questions
+                current = self.tokens_per_question[question_type]
+                self.tokens_per_question[question_type] = current + CALIBRATION_RATE * (observed - current)
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO usage (created_at, model, question_type, questions, prompt_chars, prompt_tokens, completion_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (time.time(), self.model, question_type, questions, prompt_chars, prompt_tokens, completion_tokens),
+            )
+            if cursor.lastrowid % 100 == 0:
+                conn.execute("DELETE FROM usage WHERE id <= ?", (cursor.lastrowid - MAX_USAGE_ROWS,))